@@ -4,9 +4,25 @@ import sys
 import subprocess
 from enum import Enum, IntEnum, auto, Flag, IntFlag
 import types
+import operator
 import typing
 import os
 import glob
+import linecache
+import mmap
+import errno
+import json
+import array
+import hashlib
+import tempfile
+import bisect
+import struct
+import asyncio
+import io
+import time
+import contextlib
+import concurrent.futures
+import importlib.util
 from dataclasses import dataclass, field
 from functools import lru_cache
 
@@ -17,17 +33,76 @@ HEAP_SIZE = 64 * 1<<10
 #GLOBAL_ERROR_COUNT = 0
 
 __HELP_STR__ ='''
-commandline usage: mandarin.py <[-c <input_file> <c_options>]|[-S <input_file> <s_options>]|[-t <t_options>]>
+commandline usage: mandarin.py <[-c <input_file> <c_options>]|[-b <input_file> <b_options>]|[-S <input_file> <s_options>]|[-s --batch <input_file>... <batch_options>]|[-f <input_file> <f_options>]|[-a <a_options>]|[-r <trace_file>]|[-i <i_options>]|[-t <t_options>]>
 
 <input_file> -> *.mand
 
 <c_options> -> [-o <output_file>]
 
-!not implemented yet! <s_options> -> [-s <output_file>]
+<b_options> -> [-o <output_file>]
+    -b -> lowers <input_file> to serialized bytecode, *.mandc by default
 
-<t_options> -> [record | compare]
+<s_options> -> [--engine=<engine>] [--dump-heap[=<start>:<end>]] [--heap-snapshot=<output_file>] [--heap-limit=<size>] [--heap-file=<file>] [--stdin=<file>]
+    [--checkpoint=<file> --checkpoint-at=<label>|<steps>] [--restore=<file>] [--profile[=<json_file>]]
+    [--profile-lines[=<stacks_file>]] [--branch-stats[=<json_file>]] [--heap-stats[=<json_file>]] [--trace=<trace_file>]
+    --engine=standard (default) -> match based interpreter
+    --engine=threaded -> ops pre-bound into closures before the run
+    --engine=bytecode -> lowers the program to array backed bytecode and runs that
+    --engine=aot -> runs a python module transpiled from the source, cached in __mandcache__ next to it
+        or only kept in memory when that directory can't be written
+    *.mandc input files (see -b) always run on the bytecode engine
+    --dump-heap -> hexdump of the heap after the run, the whole heap or the given byte range
+    --heap-snapshot -> writes the whole heap after the run as a raw binary file
+    --heap-limit -> size of the simulated address space (64k by default, k/m/g suffixes), pages get allocated on first write,
+        pointers stay 16 bit so only a buf that starts below 64k can reach past it, tests take it from a .limit file
+    --heap-file -> maps the heap onto <file>, its contents survive the run and are shared with other processes,
+        the file is created or grown to the heap size and an existing file keeps its size when no --heap-limit is given
+    --stdin -> lines of <file> answer dos 10 instead of the terminal, tests take them from a .in file next to the .mand
+    --checkpoint -> saves ip, stack, variables and heap to <file> right before the label (as named in -c output) or after
+        that many ops, the run goes on after that
+    --restore -> resumes from a checkpoint of the same program and heap size instead of starting at the top,
+        a --stdin file is read on from where the run that took the checkpoint was
+    --profile -> count and time every op by kind, a table sorted by time goes to stderr and as json to <json_file> if given
+    --profile-lines -> the same by source line, as the source listing with counts and time on stderr and as collapsed
+        stacks (whiles and ifs as frames, microseconds) for flamegraph tools to <stacks_file> if given
+    --branch-stats -> entries, iterations and min/max/mean trips of every while (by its label pair) and taken/not taken
+        counts of every if, as a table on stderr and as json to <json_file> if given, not together with the profiles
+    --heap-stats -> every buf and string allocation with its variable, size, bytes written and read/write counts,
+        plus the high water mark of the heap, the same way as --branch-stats
+    --trace -> records every op run as a fixed size binary record (ip, op, top of stack, heap address) to <trace_file>,
+        -r <trace_file> prints it back, Read_trace streams it for scripts
+        all of these always run on the standard engine
+
+<batch_options> -> [-j <jobs>] [--engine=<engine>] [--heap-limit=<size>]
+    --batch -> simulates every <input_file> on a pool of -j worker processes (cpu count by default), prints the output
+        of each in order and a summary of exit status, op count (standard engine only) and time per program,
+        a program reads its input from a .in file next to it if there is one
+
+<f_options> -> [--engine=<engine>] [--jobs=<n>] [--heap-limit=<size>] [--report=<output_file>] <stdin_file>...
+    -f -> fork server, parses <input_file> once and runs it on a forked child for every <stdin_file> (see --stdin),
+        at most --jobs (cpu count by default) at a time, output, errors and exit code of every run go into one json report
+
+<a_options> -> [--host=<host>] [--port=<port>] [--budget=<ops>] [--quantum=<ops>] [--heap-limit=<size>]
+    -a -> serves simulations over tcp (127.0.0.1:7777 by default), a client sends the path of a program on the first line,
+        then its input, and gets its output back, all sessions share one process and take turns every --quantum ops
+        (10000 by default) and on dos/linux calls, --budget caps the ops a session may run, --heap-limit its heap
+
+<i_options> -> [--mode=dos|linux] [--heap-limit=<size>]
+    -i -> interactive session, every statement or block is parsed and run on its own as soon as it is complete,
+        an if only once the next line shows it doesn't start an else, variables and the heap carry over,
+        `:vars` lists the variables, `:heap [START:END]` dumps the heap, `:quit` ends it
+
+<t_options> -> [record | compare | roundtrip] [--engine=<engine>]
     record -> record output of tests
-    compare (default) -> compares output of tests to recorded data
+    compare (default) -> compares output of tests to recorded data, using the selected simulation engine
+    roundtrip -> runs every test through the other modes and compares that to the recorded data:
+        mandc -> dumped with -b and run from the loaded .mandc
+        heap-file -> run on a --heap-file, which has to hold the same bytes as the paged heap afterwards
+        checkpoint -> checkpointed halfway, the restored run has to print the rest of the output
+        fork -> two runs of the -f fork server at once
+        server -> two clients of the -a server at once
+        batch -> twice in a -s --batch on two workers
+        trace -> a --trace run printed back with -r, a record for every op run
 
     -o -> specify output file for compilation
     -S -> specify output file for outputting of simulation data output
@@ -95,12 +170,22 @@ class OP(Enum):
     BUF         = auto()
     MEMWRITE    = auto()
     MEMREAD     = auto()
+    MEMWRITE8   = auto()
+    MEMWRITE16  = auto()
+    MEMREAD8    = auto()
+    MEMREAD16   = auto()
     DOS         = auto()
     LINUX       = auto()
     MODE        = auto()
     VAR         = auto()
     TYPE        = auto()
     COLON       = auto()
+    # superinstructions, only ever produced by Fuse_ops
+    INC_VAR     = auto()
+    DEC_VAR     = auto()
+    VAR_ADD     = auto()
+    VAR_SUB     = auto()
+    CMP_VAR_JUMP= auto()
     COUNT       = auto()
 
 class DT(Enum):
@@ -137,12 +222,18 @@ class Var:
     name: str
     value: bytearray = field(default_factory=bytearray)
     defined: bool = field(default=False)
+    slot: int = field(default=-1, compare=False)
 class codeBlock:
     id:         int = -1
     type:       CB = CB.COMPILETIME
     tokens:     list[Token | typing.Self] = []
     vars:       dict[str,Var]
     loc:        int = -1
+    depth:      list[int] = []
+    max_depth:  int = 0
+    slots:      list[Var] = []
+    # where the block's opening bracket is
+    file_loc:   tuple[str, int, int] = ("",-1,-1)
 
     def __init__(self: typing.Self, id: int = -1, tokens: list[Token] = [], vars: dict[str, Var] = {}):
         self.id = id
@@ -255,7 +346,7 @@ def error(errorType: Error, errorStr: str, expected: tuple[typing.Any, typing.An
     if(errorType == Error.CMD):
         sys.stdout.write(__HELP_STR__ + f"{END_}\n")
     if exitAfter:
-        exit(1)
+        sys.exit(1)
 
 class ComState(Flag):
     NONE            = auto()
@@ -267,7 +358,7 @@ def bfromNum(type: DT, value: int) -> bytearray:
 
     #if (n:=OP.COUNT.value) != (m:=33):
         #error(Error.ENUM, f"{BOLD_}Exhaustive operation protection in {bolden("bfromNum")}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
-    if (n:=DT.COUNT.value) != (m:=5):
+    if (n:=DT.COUNT.value) != (m:=8):
         error(Error.ENUM, f"{BOLD_}Exhaustive datatype protection in {bolden("bfromNum")}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
 
     match type:
@@ -931,9 +1022,18 @@ def genAsm(op: str, regs: tuple[Reg,Reg,Reg,Reg,Reg,Reg,Reg,Reg], dest: asmData
                         error(Error.COMPILE, f"Unknown datatype for generating assembly", flags = LogFlag.FAIL)
     return (regs, ret)
 
+# conditional jumps for the comparisons, unsigned like every value in the simulator
+unsigned_jumps: dict[OP, str] = {
+    OP.EQUAL    : "je",
+    OP.GREATER  : "ja",
+    OP.LESS     : "jb",
+    OP.GE       : "jae",
+    OP.LE       : "jbe",
+}
+
 def compile_data(data: list[dict]) -> None:
 
-    if (n:=OP.COUNT.value) != (m:=37):
+    if (n:=OP.COUNT.value) != (m:=46):
         error(Error.ENUM, f"{BOLD_}Exhaustive operation parsing protection in {BOLD_}compile_data{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
     
     stack: list[asmData] = []
@@ -973,7 +1073,8 @@ def compile_data(data: list[dict]) -> None:
         buffor_data = buffor_data + ".DATA\n"
         buffor_code = buffor_code + ".CODE\nstart:\n\tmov ax, @data\n\tmov ds, ax\n\tmov es, ax\n"
 
-        for ip, x in enumerate(data.tokens):
+        # v N + stays as separate ops here, register allocation already handles it well
+        for ip, x in enumerate(Expand_fused(data.tokens, (OP.VAR_ADD, OP.VAR_SUB))):
             regs = (ax, bx, cx, dx, di, si, bp, sp)
             match x.type:
                 case OP.NUM:
@@ -1125,27 +1226,10 @@ def compile_data(data: list[dict]) -> None:
                     (regs, op) = genAsm('cmp', regs, asmData(1, DT.REGISTER, BITS.B16, isReg = True), asmData(0, DT.REGISTER, BITS.B16, isReg = True))
                     buffor_code += op
                     state = ComState.NONE
-                    match condition:
-                        case OP.EQUAL:
-                            buffor_code = buffor_code + f"\tje bar{ip}\n"
-                            buffor_code = buffor_code + f"\tjmp {x.value}\n"
-                            buffor_code = buffor_code + f"bar{ip}:\n"
-                        case OP.GREATER:
-                            buffor_code = buffor_code + f"\tjg bar{ip}\n"
-                            buffor_code = buffor_code + f"\tjmp {x.value}\n"
-                            buffor_code = buffor_code + f"bar{ip}:\n"
-                        case OP.LESS:
-                            buffor_code = buffor_code + f"\tjl bar{ip}\n"
-                            buffor_code = buffor_code + f"\tjmp {x.value}\n"
-                            buffor_code = buffor_code + f"bar{ip}:\n"
-                        case OP.GE:
-                            buffor_code = buffor_code + f"\tjge bar{ip}\n"
-                            buffor_code = buffor_code + f"\tjmp {x.value}\n"
-                            buffor_code = buffor_code + f"bar{ip}:\n"
-                        case OP.LE:
-                            buffor_code = buffor_code + f"\tjle bar{ip}\n"
-                            buffor_code = buffor_code + f"\tjmp {x.value}\n"
-                            buffor_code = buffor_code + f"bar{ip}:\n"
+                    # the same jumps as a fused CMP_VAR_JUMP
+                    buffor_code += f"\t{unsigned_jumps[condition]} bar{ip}\n"
+                    buffor_code += f"\tjmp {x.value}\n"
+                    buffor_code += f"bar{ip}:\n"
                     for x in range(len(regs)):
                         regs[x].used = False
                         regs[x].DType = DT.IMMEDIATE
@@ -1159,6 +1243,32 @@ def compile_data(data: list[dict]) -> None:
                         regs[x].refCount = 0
                 case OP.LABEL:
                     buffor_code += f"{x.value}:\n"
+                case OP.INC_VAR | OP.DEC_VAR | OP.CMP_VAR_JUMP:
+                    var = data.slots[x.value.slot]
+                    if not var.defined:
+                        buffor_data = buffor_data + f"\t{var.name} {'db' if var.type == DT.UINT8 else 'dw'} ?\n"
+                        var.defined = True
+                    size = 'byte' if dosDTS[var.type] == BITS.B8 else 'word'
+                    match x.type:
+                        case OP.INC_VAR:
+                            buffor_code += f";; -- INC_VAR {var.name} --\n"
+                            buffor_code += f"\tadd {size} ptr [{var.name}], {cutNumToBit(x.value.imm, dosDTS[var.type])}\n"
+                            temp1 = var.name
+                        case OP.DEC_VAR:
+                            buffor_code += f";; -- DEC_VAR {var.name} --\n"
+                            buffor_code += f"\tsub {size} ptr [{var.name}], {cutNumToBit(x.value.imm, dosDTS[var.type])}\n"
+                            temp1 = var.name
+                        case OP.CMP_VAR_JUMP:
+                            buffor_code += f";; -- CMP_VAR_JUMP {var.name} --\n"
+                            buffor_code += f"\tcmp {size} ptr [{var.name}], {x.value.imm}\n"
+                            buffor_code += f"\t{unsigned_jumps[x.value.cond]} bar{ip}\n"
+                            buffor_code += f"\tjmp {x.value.label}\n"
+                            buffor_code += f"bar{ip}:\n"
+                    state = ComState.NONE
+                    for x in range(len(regs)):
+                        regs[x].used = False
+                        regs[x].DType = DT.IMMEDIATE
+                        regs[x].refCount = 0
                 case OP.COPY:
                     error(Error.COMPILE, "COPY: Currently Unsupported!")
                 case OP.PRINT:
@@ -1247,7 +1357,39 @@ def compile_data(data: list[dict]) -> None:
                         buffor_code += "\tint 21h\n"
                     else:
                         error(Error.SIMULATE, "only 2, 9, 10 dos calls are implemented yet")
+                case OP.MEMWRITE8 | OP.MEMWRITE16:
+                    # the width comes with the op, so a byte or word store whatever the value on the stack is
+                    (bits, size) = (BITS.B8, 'byte') if x.type == OP.MEMWRITE8 else (BITS.B16, 'word')
+                    reg = b8tuplel if bits == BITS.B8 else b16tuple
+                    buffor_code += f";; -- {x.type.name} --\n"
+                    if len(stack) == 2:
+                        a = stack.pop()
+                        dest = f"[{stack.pop().data}]"
+                    elif len(stack) == 1:
+                        a = stack.pop()
+                        buffor_code += f"\tmov {b16tuple[6]}, {b16tuple[0]}\n"
+                        dest = f"[{b16tuple[6]}]"
+                    else:
+                        error(Error.COMPILE, f"{x.type.name}: nothing to write", flags = LogFlag.FAIL)
+                    match a.datatype:
+                        case DT.IMMEDIATE:
+                            src = str(cutNumToBit(a.data, bits))
+                        case DT.REGISTER:
+                            src = reg[a.data]
+                        case DT.UINT8MEM | DT.UINT16MEM:
+                            buffor_code += f"\tmov {b16tuple[3]}, offset {a.data}\n"
+                            src = reg[3]
+                        case _:
+                            if dosDTSex[a.datatype] == BITS.B8:
+                                buffor_code += f"\tmov {b8tuplel[3]}, byte ptr [{a.data}]\n"
+                                if bits == BITS.B16:
+                                    buffor_code += f"\txor {b8tupleh[3]}, {b8tupleh[3]}\n"
+                            else:
+                                buffor_code += f"\tmov {b16tuple[3]}, word ptr [{a.data}]\n"
+                            src = reg[3]
+                    buffor_code += f"\tmov {size} ptr {dest}, {src}\n"
                 case OP.MEMWRITE:
+                    # only reached by op streams that were never specialized
                     buffor_code += ";; -- MEMWRITE --\n"
                     if len(stack) == 1:
                         a = stack.pop()
@@ -1258,7 +1400,27 @@ def compile_data(data: list[dict]) -> None:
                         b = stack.pop()
                         (regs, op) = genAsm('mov', regs, b, a)
                         buffor_code += op
+                case OP.MEMREAD8 | OP.MEMREAD16:
+                    buffor_code += f";; -- {x.type.name} --\n"
+                    if ax.used:
+                        buffor_code += f"\tmov {b16tuple[7]}, {b16tuple[0]}\n"
+                        src = f"[{b16tuple[7]}]"
+                    elif len(stack) > 0:
+                        a = stack.pop()
+                        if a.datatype not in pointer_types:
+                            error(Error.COMPILE, "Reading from non memory variable")
+                        src = f"[{a.data}]"
+                    else:
+                        error(Error.COMPILE, f"{x.type.name}: no address to read from", flags = LogFlag.FAIL)
+                    if x.type == OP.MEMREAD8:
+                        buffor_code += f"\tmov {b8tuplel[0]}, byte ptr {src}\n"
+                        buffor_code += f"\txor {b8tupleh[0]}, {b8tupleh[0]}\n"
+                    else:
+                        buffor_code += f"\tmov {b16tuple[0]}, word ptr {src}\n"
+                    ax.used = True
+                    ax.DType = DT.UINT8 if x.type == OP.MEMREAD8 else DT.UINT16
                 case OP.MEMREAD:
+                    # only reached by op streams that were never specialized
                     buffor_code += ";; -- MEMREAD --\n"
                     if ax.used:
                         (regs, op) = genAsm('mov', regs, asmData(0, DT.REGISTER, BITS.B16, isReg = True), asmData(0, DT.REGISTER, BITS.B16, refCount = -1, isReg = True))
@@ -1297,268 +1459,2271 @@ def compile_data(data: list[dict]) -> None:
         #print(buffor_start, buffor_data, buffor_code)
         return buffor_start + buffor_data + buffor_code
 
-def simulate_data(data: codeBlock, out = sys.stdout):
-    
-    if (n:=OP.COUNT.value) != (m:=37):
-        error(Error.ENUM, f"{BOLD_}Exhaustive operation parsing protection in {BOLD_}simulate_data{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
-    
-    heap = bytearray(HEAP_SIZE)
-    heap_end = 0
-    stack: list[int] = []
+class HeapError(Exception):
+    pass
+
+class BudgetError(Exception):
+    pass
+
+HEAP_PAGE_BITS = 12
+HEAP_PAGE_SIZE = 1 << HEAP_PAGE_BITS
+HEAP_PAGE_MASK = HEAP_PAGE_SIZE - 1
+
+class pagedHeap:
+    # `limit` bytes of address space in fixed size pages, a page only gets allocated once something is written to it
+    # and reads from untouched pages see zeros, any access outside of [0, limit) raises HeapError
+
+    def __init__(self, limit: int = HEAP_SIZE):
+        self.limit = limit
+        self.pages: list[bytearray | None] = [None] * ((limit + HEAP_PAGE_MASK) >> HEAP_PAGE_BITS)
+
+    def __len__(self) -> int:
+        return self.limit
+
+    def check(self, start: int, end: int) -> None:
+        if not 0 <= start <= end <= self.limit:
+            raise HeapError(f"Heap access `{start}:{end}` outside of the {self.limit} byte heap")
+
+    def pointer(self, address: int) -> int:
+        # variables hold 16 bit pointers, an allocation starting past that is an error instead of wrapping around to 0,
+        # a buffer that starts below it can still reach any address of the heap through arithmetic
+        if not 0 <= address <= 0xFFFF:
+            raise HeapError(f"Heap address `{address}` doesn't fit a 16 bit pointer, allocate big buffers before small ones")
+        return address
+
+    def buf(self, start: int, size: int) -> None:
+        # the first byte of a buf is the most dos 10 may read into it, the size minus that byte and the count byte,
+        # capped at what a byte holds
+        self.check(start, start+size)
+        if size:
+            self[start] = max(0, min(size-2, 0xFF))
+
+    def page(self, n: int) -> bytearray:
+        if (p:=self.pages[n]) is None:
+            p = self.pages[n] = bytearray(HEAP_PAGE_SIZE)
+        return p
+
+    def span(self, key: slice) -> tuple[int, int, int]:
+        start = 0 if key.start is None else key.start
+        stop = self.limit if key.stop is None else key.stop
+        step = 1 if key.step is None else key.step
+        if step < 1:
+            raise HeapError(f"Heap slice with a step of `{step}`")
+        self.check(start, max(start, stop))
+        return (start, max(start, stop), step)
+
+    def read(self, start: int, end: int) -> bytes:
+        self.check(start, end)
+        chunks: list[bytes] = []
+        while start < end:
+            n = min(end, (start | HEAP_PAGE_MASK) + 1)
+            o = start & HEAP_PAGE_MASK
+            p = self.pages[start >> HEAP_PAGE_BITS]
+            chunks.append(p[o:o+n-start] if p is not None else bytes(n-start))
+            start = n
+        return b"".join(chunks)
+
+    def write(self, start: int, data: bytes | bytearray | memoryview) -> None:
+        data = memoryview(data)
+        end = start + len(data)
+        self.check(start, end)
+        x = 0
+        while start < end:
+            n = min(end, (start | HEAP_PAGE_MASK) + 1)
+            o = start & HEAP_PAGE_MASK
+            self.page(start >> HEAP_PAGE_BITS)[o:o+n-start] = data[x:x+n-start]
+            x += n-start
+            start = n
+
+    def find(self, sub: bytes, start: int, end: int) -> int:
+        i = self.read(start, min(end, self.limit)).find(sub)
+        return i if i == -1 else start + i
+
+    def view(self, start: int, end: int) -> memoryview:
+        return memoryview(self.read(start, end))
+
+    def readinto(self, f: typing.BinaryIO, start: int, count: int) -> int:
+        # fills the heap straight from `f` one page at a time, stops early at the end of the file
+        end = start + count
+        self.check(start, end)
+        fill = getattr(f, 'readinto1', f.readinto)
+        x = start
+        while x < end:
+            n = min(end, (x | HEAP_PAGE_MASK) + 1)
+            o = x & HEAP_PAGE_MASK
+            with memoryview(self.page(x >> HEAP_PAGE_BITS)) as p:
+                k = fill(p[o:o+n-x]) or 0
+            if k < n-x:
+                return x + k - start
+            x = n
+        return x - start
+
+    def __getitem__(self, key: int | slice) -> int | bytes:
+        if type(key) is int:
+            if not 0 <= key < self.limit:
+                raise HeapError(f"Heap access `{key}` outside of the {self.limit} byte heap")
+            p = self.pages[key >> HEAP_PAGE_BITS]
+            return p[key & HEAP_PAGE_MASK] if p is not None else 0
+        (start, stop, step) = self.span(key)
+        if step == 1:
+            return self.read(start, stop)
+        return bytes(self[x] for x in range(start, stop, step))
+
+    def __setitem__(self, key: int | slice, value: typing.Any) -> None:
+        if type(key) is int:
+            if not 0 <= key < self.limit:
+                raise HeapError(f"Heap access `{key}` outside of the {self.limit} byte heap")
+            if (p:=self.pages[key >> HEAP_PAGE_BITS]) is None:
+                p = self.page(key >> HEAP_PAGE_BITS)
+            p[key & HEAP_PAGE_MASK] = value
+            return
+        (start, stop, step) = self.span(key)
+        if len(value) != len(range(start, stop, step)):
+            raise HeapError(f"Heap slice `{start}:{stop}` can't be resized to {len(value)} bytes")
+        if step == 1:
+            self.write(start, value)
+        else:
+            for x, y in zip(range(start, stop, step), value):
+                self[x] = y
+
+    def close(self) -> None:
+        pass
+
+class mappedHeap(pagedHeap):
+    # pages are views into a shared mmap of `path`, so the heap outlives the run and other processes see it change,
+    # the file grows to `limit` bytes when it is shorter and is never truncated
+
+    def __init__(self, path: str, limit: int = HEAP_SIZE):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            if os.fstat(fd).st_size < limit:
+                os.truncate(fd, limit)
+            self.map = mmap.mmap(fd, limit)
+        finally:
+            os.close(fd)
+        self.limit = limit
+        self.mem = memoryview(self.map)
+        self.pages = [self.mem[x:x+HEAP_PAGE_SIZE] for x in range(0, limit, HEAP_PAGE_SIZE)]
+
+    def read(self, start: int, end: int) -> bytes:
+        self.check(start, end)
+        return self.mem[start:end].tobytes()
+
+    def write(self, start: int, data: bytes | bytearray | memoryview) -> None:
+        self.check(start, start + len(data))
+        self.mem[start:start+len(data)] = data
+
+    def readinto(self, f: typing.BinaryIO, start: int, count: int) -> int:
+        self.check(start, start + count)
+        return f.readinto(self.mem[start:start+count]) or 0
+
+    def close(self) -> None:
+        # every view has to be gone before the map can be closed
+        for page in self.pages:
+            page.release()
+        self.pages = []
+        self.mem.release()
+        self.map.flush()
+        self.map.close()
+
+@dataclass
+class simState:
+    heap:       pagedHeap
+    out:        typing.Any = sys.stdout
+    # input for dos 10 and linux reads of fd 0 comes from here when set, otherwise from the terminal
+    stdin:      typing.BinaryIO | None = None
+    heap_end:   int = 0
+    stack:      list[int] = field(default_factory=list)
+    state:      ComState = ComState.NONE
+    temp1:      int = -1
+    condition:  OP | None = None
+    jumps:      list[int] = field(default_factory=list)
+    depth:      list[int] = field(default_factory=list)
+    # variable values by slot, already cut to the width of their type
+    values:     array.array = field(default_factory=lambda: array.array('H'))
+    masks:      list[int] = field(default_factory=list)
+    types:      list[DT] = field(default_factory=list)
+    # host files opened with the linux `open` call, by the descriptor handed to the program
+    files:      dict[int, typing.BinaryIO] = field(default_factory=dict)
+    # ops run, only counted when asked for, -1 otherwise
+    steps:      int = -1
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        self.heap.close()
+
+    def bind_vars(self, slots: list[Var]) -> typing.Self:
+        self.values = array.array('H', bytes(2 * len(slots)))
+        self.masks = [0xFF if x.type == DT.UINT8 else 0xFFFF for x in slots]
+        self.types = [x.type for x in slots]
+        return self
+
+@dataclass
+class opProfile:
+    # executions and nanoseconds of every op of a run, by ip
+    tokens:     list[OpType] = field(default_factory=list)
+    counts:     list[int] = field(default_factory=list)
+    times:      list[int] = field(default_factory=list)
+
+    def by_op(self) -> dict[OP, list[int]]:
+        ret: dict[OP, list[int]] = {}
+        for (x, n, ns) in zip(self.tokens, self.counts, self.times):
+            if n:
+                r = ret.setdefault(x.type, [0, 0])
+                r[0] += n
+                r[1] += ns
+        return ret
+
+    def by_line(self) -> dict[tuple[str, int], list[int]]:
+        ret: dict[tuple[str, int], list[int]] = {}
+        for (x, n, ns) in zip(self.tokens, self.counts, self.times):
+            if n:
+                r = ret.setdefault(x.file_loc[:2], [0, 0])
+                r[0] += n
+                r[1] += ns
+        return ret
+
+TRACE_MAGIC = b"MANDTR\x01"
+# ip, op value, low 32 bits of the top of the stack after the op (0 when empty), heap address the op touched (TRACE_NO_ADDR if none)
+TRACE_RECORD = struct.Struct("<IBII")
+TRACE_NO_ADDR = 0xFFFFFFFF
+TRACE_BUFFER = 1 << 16
+
+def Trace_header(f: typing.BinaryIO, data: codeBlock) -> None:
+    header = json.dumps({
+        "record"    : TRACE_RECORD.format,
+        "ops"       : {x.value: x.name for x in OP},
+        "files"     : [x.file_loc for x in data.tokens],
+    }).encode("utf-8")
+    f.write(TRACE_MAGIC)
+    f.write(len(header).to_bytes(4, 'little'))
+    f.write(header)
+
+def Read_trace(in_path: str) -> typing.Iterator[tuple[int, OP, int, int | None]]:
+    # streams the records of a --trace file back as (ip, op, top of stack, address or None)
+    with open(in_path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            error(Error.SIMULATE, f"{bolden(in_path)} is not a mandarine trace file", flags = LogFlag.FAIL)
+        header = json.loads(f.read(int.from_bytes(f.read(4), 'little')).decode("utf-8"))
+        ops = {int(k): OP[v] for (k, v) in header["ops"].items()}
+        while chunk:=f.read(TRACE_RECORD.size * TRACE_BUFFER):
+            for (ip, op, top, addr) in TRACE_RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % TRACE_RECORD.size]):
+                yield (ip, ops[op], top, None if addr == TRACE_NO_ADDR else addr)
+
+def Trace_locations(in_path: str) -> list[tuple[str, int, int]]:
+    # file_loc of every ip of the traced program
+    with open(in_path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            error(Error.SIMULATE, f"{bolden(in_path)} is not a mandarine trace file", flags = LogFlag.FAIL)
+        return [tuple(x) for x in json.loads(f.read(int.from_bytes(f.read(4), 'little')).decode("utf-8"))["files"]]
+
+def Print_trace(in_path: str, out = sys.stdout) -> None:
+    # one line per record with the source location of its op, what -r prints
+    locations = Trace_locations(in_path)
+    for (ip, op, top, addr) in Read_trace(in_path):
+        out.write(f"{ip:>8} {op.name:<14} {top:>10} {'' if addr is None else f'{addr:#06x}':>8}  {locations[ip][0]}:{locations[ip][1]+1}:{locations[ip][2]}\n")
+
+# hooks of the instrumented loop in simulate_data, called with the ip of the op about to run (before)
+# or with the ip the op handed back (after)
+simHook = typing.Callable[[simState, int], None]
+
+@dataclass
+class heapProfile:
+    # every allocation made by buf and string literals with the variable it went to, how often it was read and written
+    # (mem ops, dos 9/10 and linux read/write/open) and which of its bytes got written
+    allocations: list[dict] = field(default_factory=list)
+    starts:     list[int] = field(default_factory=list)
+    masks:      list[bytearray] = field(default_factory=list)
+    outside:    dict[str, int] = field(default_factory=lambda: {"reads": 0, "writes": 0})
+    high_water: int = 0
+    limit:      int = 0
+
+    def access(self, addr: int, n: int, write: bool) -> None:
+        i = bisect.bisect_right(self.starts, addr) - 1
+        if i < 0 or addr >= self.starts[i] + self.allocations[i]["size"]:
+            self.outside["writes" if write else "reads"] += 1
+            return
+        self.allocations[i]["writes" if write else "reads"] += 1
+        if write:
+            o = addr - self.starts[i]
+            mask = self.masks[i]
+            mask[o:o+n] = b"\x01" * len(mask[o:o+n])
+
+    def attach(self, data: codeBlock, before: list[simHook | None], after: list[simHook | None]) -> None:
+        # BUF, STRING, DOS and LINUX never jump, so their after hook gets ip+1
+        slots = data.slots
+        pending: list[tuple[int, str]] = []
+        calls: list[tuple[int, OP]] = []
+        def alloc_before(m: simState, ip: int) -> None:
+            vardef = ComState.VARDEF in m.state and 0 <= m.temp1 < len(slots)
+            pending.append((m.heap_end, slots[m.temp1].name[1:] if vardef else ""))
+        def alloc_after(m: simState, ip: int) -> None:
+            (start, owner) = pending.pop()
+            x = data.tokens[ip-1]
+            if m.heap_end > start:
+                self.starts.append(start)
+                self.masks.append(bytearray(m.heap_end - start))
+                self.allocations.append({"owner": owner, "kind": x.type.name.lower(), "start": start, "size": m.heap_end - start,
+                    "touched": 0, "reads": 0, "writes": 0, "file": x.file_loc[0], "line": x.file_loc[1]+1})
+            self.high_water = max(self.high_water, m.heap_end)
+        def mem(n: int, write: bool) -> simHook:
+            # writes have the address under the value, reads on top of the stack
+            def h(m: simState, ip: int) -> None:
+                self.access(m.stack[m.depth[ip] - (2 if write else 1)], n, write)
+            return h
+        def call_before(m: simState, ip: int) -> None:
+            sp = m.depth[ip]-1
+            (a, stack) = (m.stack[sp], m.stack)
+            if data.tokens[ip].type == OP.DOS:
+                if a == 9:
+                    self.access(stack[sp-1], 1, False)
+                elif a == 10:
+                    calls.append((stack[sp-1], OP.DOS))
+            elif a == 1:
+                self.access(stack[sp-2], stack[sp-3], False)
+            elif a == 2:
+                self.access(stack[sp-1], 1, False)
+            elif a == 0:
+                calls.append((stack[sp-2], OP.LINUX))
+        def call_after(m: simState, ip: int) -> None:
+            if not calls:
+                return
+            (addr, kind) = calls.pop()
+            # dos 10 fills in the count and the characters, a linux read leaves how much it read on the stack
+            if kind == OP.DOS:
+                self.access(addr+1, m.heap[addr+1]+1, True)
+            elif (n:=m.stack[m.depth[ip]-1]) > 0:
+                self.access(addr, n, True)
+        for (i, x) in enumerate(data.tokens):
+            match x.type:
+                case OP.BUF | OP.STRING:
+                    (before[i], after[i]) = (alloc_before, alloc_after)
+                case OP.MEMWRITE8 | OP.MEMWRITE16 | OP.MEMREAD8 | OP.MEMREAD16:
+                    before[i] = mem(1 if x.type in (OP.MEMWRITE8, OP.MEMREAD8) else 2, x.type in (OP.MEMWRITE8, OP.MEMWRITE16))
+                case OP.DOS | OP.LINUX:
+                    (before[i], after[i]) = (call_before, call_after)
+
+    def finish(self, m: simState) -> None:
+        for (x, mask) in zip(self.allocations, self.masks):
+            x["touched"] = len(mask) - mask.count(0)
+        self.high_water = max(self.high_water, m.heap_end)
+        self.limit = len(m.heap)
+
+@dataclass
+class branchProfile:
+    # trip counts of every while and how often the body of every if ran, filled in through hooks on their jumps and labels
+    loops:      list[dict] = field(default_factory=list)
+    ifs:        list[dict] = field(default_factory=list)
+
+    def attach(self, data: codeBlock, before: list[simHook | None], after: list[simHook | None]) -> None:
+        # while: LABEL a, <condition>, CONJUMP b, <body>, JUMP a, LABEL b   if: CONJUMP a, <then>, [JUMP b,] LABEL a, ...
+        tokens = data.tokens
+        labels: dict[str, int] = {x.value: i for (i, x) in enumerate(tokens) if x.type == OP.LABEL}
+        hooks = after
+        for (i, x) in enumerate(tokens):
+            if x.type == OP.JUMP and labels[x.value] < i and i+1 < len(tokens) and tokens[i+1].type == OP.LABEL:
+                loop = {"head": x.value, "exit": tokens[i+1].value, "file": x.file_loc[0], "line": x.file_loc[1]+1,
+                        "entries": 0, "iterations": 0, "min": None, "max": None, "mean": 0.0}
+                self.loops.append(loop)
+                (hooks[i], hooks[i+1]) = self.loop_hooks(loop)
+            elif x.type in (OP.CONJUMP, OP.CMP_VAR_JUMP):
+                t = labels[x.value.label if x.type == OP.CMP_VAR_JUMP else x.value]
+                if tokens[t-1].type == OP.JUMP and labels[tokens[t-1].value] < i:
+                    continue
+                branch = {"label": tokens[t].value, "file": x.file_loc[0], "line": x.file_loc[1]+1, "taken": 0, "not_taken": 0}
+                self.ifs.append(branch)
+                hooks[i] = self.if_hook(branch, i+1)
+        # back jumps come after the loop body, so nested loops got found before the loops around them
+        self.loops.sort(key = lambda x: labels[x["head"]])
+
+    @staticmethod
+    def loop_hooks(loop: dict) -> tuple[simHook, simHook]:
+        trip = [0]
+        def back(m: simState, ip: int) -> None:
+            trip[0] += 1
+        def leave(m: simState, ip: int) -> None:
+            n = trip[0]
+            trip[0] = 0
+            loop["entries"] += 1
+            loop["iterations"] += n
+            loop["min"] = n if loop["min"] is None else min(loop["min"], n)
+            loop["max"] = n if loop["max"] is None else max(loop["max"], n)
+            loop["mean"] = loop["iterations"] / loop["entries"]
+        return (back, leave)
+
+    @staticmethod
+    def if_hook(branch: dict, then: int) -> simHook:
+        def h(m: simState, ip: int) -> None:
+            branch["taken" if ip == then else "not_taken"] += 1
+        return h
+
+dos_arity: dict[int, int] = {
+    2   : 1,
+    9   : 1,
+    10  : 1,
+}
+
+linux_arity: dict[int, int] = {
+    0   : 3,
+    1   : 3,
+    2   : 3,
+    3   : 1,
+}
+
+# calls that leave their result (or -errno) on the operand stack
+linux_results: tuple[int, ...] = (0, 2)
+
+linux_open_flags: dict[int, int] = {
+    0o1     : os.O_WRONLY,
+    0o2     : os.O_RDWR,
+    0o100   : os.O_CREAT,
+    0o200   : os.O_EXCL,
+    0o1000  : os.O_TRUNC,
+    0o2000  : os.O_APPEND,
+}
+
+def sim_write(stream: typing.Any, data: memoryview) -> None:
+    # streams backed by a file descriptor get the raw bytes in one syscall, anything else (test captures) one decoded string
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError):
+        stream.write(str(data, 'latin-1'))
+        return
+    stream.flush()
+    while data:
+        data = data[os.write(fd, data):]
+
+# args come in the order they are popped off the operand stack, dos_arity/linux_arity say how many each call takes
+def sim_dos(m: simState, a: int, args: tuple[int, ...]) -> None:
+    heap = m.heap
+    if a == 2:
+        sim_write(m.out, memoryview(bytes((args[0] & 0xFF,))))
+    elif a == 9:
+        b = args[0]
+        if (end:=heap.find(b'$', b, b+(1<<8))) == -1:
+            end = min(b+(1<<8), len(heap))
+        sim_write(m.out, heap.view(b, end))
+    elif a == 10:
+        b = args[0]
+        if m.stdin is None:
+            c = input("> ").encode('latin-1', 'replace')
+        else:
+            # an exhausted input file reads as empty lines
+            c = m.stdin.readline().rstrip(b"\r\n")
+        c = c[:heap[b]]
+        heap[b+2:b+2+len(c)] = c
+        heap[b+1] = len(c)
+    else:
+        error(Error.SIMULATE, "only 2, 9 and 10 dos calls are implemented yet")
+
+def sim_open(m: simState, path: bytes, flags: int, mode: int) -> int:
+    host = getattr(os, 'O_BINARY', 0)
+    for bit, flag in linux_open_flags.items():
+        if flags & bit:
+            host |= flag
+    fd = os.open(path, host, mode)
+    if flags & 0o2000:
+        m.files[fd] = open(fd, 'ab')
+    elif flags & 0o2:
+        m.files[fd] = open(fd, 'r+b')
+    elif flags & 0o1:
+        m.files[fd] = open(fd, 'wb')
+    else:
+        m.files[fd] = open(fd, 'rb')
+    return fd
+
+# read, open and close go to real host files, only read and open leave a result so only they hand errors back to
+# the program as -errno like from the kernel, write to a bad fd is reported and skipped and close of one is ignored
+def sim_linux(m: simState, a: int, args: tuple[int, ...]) -> int | None:
+    heap = m.heap
+    try:
+        if a == 0:
+            (b, c, d) = args
+            if b == 0:
+                return heap.readinto(m.stdin if m.stdin is not None else sys.stdin.buffer, c, d)
+            if b not in m.files:
+                return -errno.EBADF
+            return heap.readinto(m.files[b], c, d)
+        elif a == 1:
+            (b, c, d) = args
+            if b == 1:
+                sim_write(m.out, heap.view(c, c+d))
+            elif b == 2:
+                sim_write(sys.stderr, heap.view(c, c+d))
+            elif b in m.files:
+                m.files[b].write(heap.view(c, c+d))
+            else:
+                error(Error.SIMULATE, f"write to file descriptor `{b}` that is not open, skipping...", exitAfter=False)
+        elif a == 2:
+            (b, c, d) = args
+            # the path ends at a NUL or `$`, whichever comes first
+            path = heap.read(b, min(b+4096, len(heap)))
+            end = min(x for x in (path.find(b'\0'), path.find(b'$'), len(path)) if x != -1)
+            if end == 4096:
+                return -errno.ENAMETOOLONG
+            return sim_open(m, path[:end], c, d)
+        elif a == 3:
+            (b,) = args
+            if (f:=m.files.pop(b, None)) is not None:
+                f.close()
+    except OSError as e:
+        return -(e.errno or errno.EIO)
+    return None
+
+# printable ascii stays, everything else shows up as a dot
+heap_ascii: bytes = bytes(x if 32 <= x < 127 else ord('.') for x in range(256))
+
+def Dump_heap(heap: pagedHeap, start: int = 0, end: int | None = None, out = sys.stdout) -> None:
+    view = heap.view(start, len(heap) if end is None else min(end, len(heap)))
+    lines: list[str] = []
+    last: memoryview | None = None
+    for x in range(0, len(view), 16):
+        row = view[x:x+16]
+        # runs of identical rows collapse into a single `*`, like hexdump does
+        if row == last:
+            if lines[-1] != "*":
+                lines.append("*")
+            continue
+        last = row
+        lines.append(f"{start+x:05x}: {row.hex(' '):<47} |{row.tobytes().translate(heap_ascii).decode('ascii')}|")
+    lines.append(f"{start+len(view):05x}")
+    out.write("\n".join(lines) + "\n")
+
+def Snapshot_heap(heap: pagedHeap, out_path: str) -> None:
+    with open(out_path, 'wb') as f:
+        for x in range(0, len(heap), HEAP_PAGE_SIZE):
+            f.write(heap.view(x, min(x+HEAP_PAGE_SIZE, len(heap))))
+
+CHECKPOINT_MAGIC = b"MANDCP\x01"
+
+def Program_digest(data: codeBlock) -> str:
+    # a checkpoint only fits the exact op stream and variable slots it was taken from
+    return hashlib.sha256(bytes(x.type.value for x in data.tokens) + "\0".join(x.name for x in data.slots).encode("utf-8")).hexdigest()[:16]
+
+def Save_checkpoint(m: simState, data: codeBlock, ip: int, out_path: str) -> None:
+    if m.files:
+        error(Error.SIMULATE, "open linux files can't be saved in a checkpoint", flags = LogFlag.FAIL)
+    heap = m.heap
+    # only pages holding something other than zeros are stored
+    pages: list[tuple[int, bytes]] = []
+    for n in range(len(heap.pages)):
+        if heap.pages[n] is None:
+            continue
+        page = heap.read(n << HEAP_PAGE_BITS, min((n+1) << HEAP_PAGE_BITS, len(heap)))
+        if page.count(0) != len(page):
+            pages.append((n, page))
+    header = json.dumps({
+        "program"   : Program_digest(data),
+        "ip"        : ip,
+        "stack"     : m.stack,
+        "state"     : m.state.value,
+        "temp1"     : m.temp1,
+        "condition" : 0 if m.condition is None else m.condition.value,
+        "heap_end"  : m.heap_end,
+        "stdin"     : m.stdin.tell() if m.stdin is not None and m.stdin.seekable() else 0,
+        "limit"     : len(heap),
+        "pages"     : [n for (n, _) in pages],
+    }).encode("utf-8")
+    values = array.array('H', m.values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    with open(out_path, 'wb') as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        values.tofile(f)
+        for (_, page) in pages:
+            f.write(page)
+
+def Load_checkpoint(m: simState, data: codeBlock, in_path: str) -> int:
+    # fills `m` back in and returns the ip to resume at
+    heap = m.heap
+    with open(in_path, 'rb') as f:
+        if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            error(Error.SIMULATE, f"{bolden(in_path)} is not a mandarine checkpoint file", flags = LogFlag.FAIL)
+        header = json.loads(f.read(int.from_bytes(f.read(4), 'little')).decode("utf-8"))
+        if header["program"] != Program_digest(data):
+            error(Error.SIMULATE, f"{bolden(in_path)} was taken from a different program", flags = LogFlag.FAIL)
+        if header["limit"] != len(heap):
+            error(Error.SIMULATE, f"{bolden(in_path)} was taken with a {header["limit"]} byte heap, this run has {len(heap)} bytes", flags = LogFlag.FAIL)
+        values = array.array('H')
+        values.fromfile(f, len(m.values))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        m.values[:] = values
+        saved = set(header["pages"])
+        for n in range(len(heap.pages)):
+            end = min((n+1) << HEAP_PAGE_BITS, len(heap))
+            if n in saved:
+                heap.write(n << HEAP_PAGE_BITS, f.read(end - (n << HEAP_PAGE_BITS)))
+            elif heap.pages[n] is not None:
+                heap.write(n << HEAP_PAGE_BITS, bytes(end - (n << HEAP_PAGE_BITS)))
+    m.stack[:] = header["stack"]
+    m.state = ComState(header["state"])
+    m.temp1 = header["temp1"]
+    m.condition = OP(header["condition"]) if header["condition"] else None
+    m.heap_end = header["heap_end"]
+    if m.stdin is not None and m.stdin.seekable():
+        m.stdin.seek(header.get("stdin", 0))
+    return header["ip"]
+
+def Resolve_labels(data: codeBlock) -> list[int]:
+
+    # index of the target LABEL for every CONJUMP and JUMP, -1 for any other op
+    labels: dict[str, int] = {}
+    for ip, x in enumerate(data.tokens):
+        if x.type == OP.LABEL:
+            if x.value in labels:
+                error(Error.PARSE, f"Label `{bolden(x.value)}` defined more than once, at `{labels[x.value]}` and `{ip}`", flags = LogFlag.FAIL)
+            labels[x.value] = ip
+
+    jumps: list[int] = [-1] * len(data.tokens)
+    for ip, x in enumerate(data.tokens):
+        if x.type in (OP.CONJUMP, OP.JUMP, OP.CMP_VAR_JUMP):
+            label = x.value.label if x.type == OP.CMP_VAR_JUMP else x.value
+            if label not in labels:
+                error(Error.PARSE, f"{x.type.name} at `{ip}` targets undefined label `{bolden(label)}`", flags = LogFlag.FAIL)
+            jumps[ip] = labels[label]
+    return jumps
+
+cond_fun: dict[OP, typing.Callable[[int, int], bool]] = {
+    OP.EQUAL    : operator.eq,
+    OP.GREATER  : operator.gt,
+    OP.LESS     : operator.lt,
+    OP.GE       : operator.ge,
+    OP.LE       : operator.le,
+}
+
+binary_fun: dict[OP, typing.Callable[[int, int], int]] = {
+    OP.ADD  : operator.add,
+    OP.SUB  : operator.sub,
+    OP.MUL  : operator.mul,
+    OP.DIV  : operator.floordiv,
+    OP.MOD  : operator.mod,
+    OP.SHL  : operator.lshift,
+    OP.SHR  : operator.rshift,
+}
+
+
+# handlers for simulate_data, indexed by OP value, each one returns the index of the next op to run
+sim_table: list[typing.Callable[[simState, OpType, int], int] | None] = [None] * OP.COUNT.value
+
+def sim_op(*ops: OP) -> typing.Callable:
+    def register(fun: typing.Callable[[simState, OpType, int], int]) -> typing.Callable[[simState, OpType, int], int]:
+        for op in ops:
+            if sim_table[op.value] is not None:
+                error(Error.ENUM, f"Second simulation handler registered for `{bolden(op.name)}`: `{sim_table[op.value].__name__}` and `{fun.__name__}`", flags = LogFlag.FAIL)
+            sim_table[op.value] = fun
+        return fun
+    return register
+
+@sim_op(OP.NUM)
+def sim_num(m: simState, x: OpType, ip: int) -> int:
+    m.stack[m.depth[ip]] = int(x.value)
+    return ip+1
+
+@sim_op(OP.STRING)
+def sim_string(m: simState, x: OpType, ip: int) -> int:
+    heap = m.heap
+    if ComState.VARDEF in m.state:
+        match m.types[m.temp1]:
+            case DT.UINT8MEM:
+                for y in range(len(x.value)):
+                    heap[m.heap_end+y] = ord(x.value[y])
+                heap[m.heap_end+len(x.value)] = ord('$')
+                m.values[m.temp1] = heap.pointer(m.heap_end)
+                m.heap_end += len(x.value)+1
+            case DT.UINT16MEM:
+                for y in range(len(x.value)):
+                    heap[m.heap_end+y*2] = ord(x.value[y])
+                heap[m.heap_end+len(x.value)*2] = ord('$')
+                m.values[m.temp1] = heap.pointer(m.heap_end)
+                m.heap_end += (len(x.value)+1)*2
+        m.state = ComState.NONE
+    else:
+        for y in range(len(x.value)):
+            heap[m.heap_end+y] = ord(x.value[y])
+        heap[m.heap_end+len(x.value)] = ord('$')
+        m.stack[m.depth[ip]] = heap.pointer(m.heap_end)
+        m.heap_end += len(x.value)+1
+    return ip+1
+
+@sim_op(OP.ADD)
+def sim_add(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] + stack[sp-1]
+    return ip+1
+
+@sim_op(OP.SUB)
+def sim_sub(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] - stack[sp-1]
+    return ip+1
+
+@sim_op(OP.MUL)
+def sim_mul(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] * stack[sp-1]
+    return ip+1
+
+@sim_op(OP.DIV)
+def sim_div(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] // stack[sp-1]
+    return ip+1
+
+@sim_op(OP.MOD)
+def sim_mod(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] % stack[sp-1]
+    return ip+1
+
+@sim_op(OP.SHL)
+def sim_shl(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] << stack[sp-1]
+    return ip+1
+
+@sim_op(OP.SHR)
+def sim_shr(m: simState, x: OpType, ip: int) -> int:
+    stack = m.stack
+    sp = m.depth[ip]
+    stack[sp-2] = stack[sp-2] >> stack[sp-1]
+    return ip+1
+
+@sim_op(OP.IF, OP.WHILE)
+def sim_condition_block(m: simState, x: OpType, ip: int) -> int:
+    m.state = ComState.CONDITION
+    return ip+1
+
+@sim_op(OP.EQUAL, OP.GREATER, OP.LESS, OP.GE, OP.LE)
+def sim_condition(m: simState, x: OpType, ip: int) -> int:
+    m.condition = x.type
+    return ip+1
+
+@sim_op(OP.CONJUMP)
+def sim_conjump(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]
+    m.state = ComState.NONE
+    return ip+1 if cond_fun[m.condition](m.stack[sp-2], m.stack[sp-1]) else m.jumps[ip]
+
+@sim_op(OP.JUMP)
+def sim_jump(m: simState, x: OpType, ip: int) -> int:
+    m.state = ComState.NONE
+    return m.jumps[ip]
+
+@sim_op(OP.COPY)
+def sim_copy(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]
+    m.stack[sp] = m.stack[sp-1]
+    return ip+1
+
+@sim_op(OP.PRINT)
+def sim_print(m: simState, x: OpType, ip: int) -> int:
+    m.out.write(str(m.stack[m.depth[ip]-1]))
+    return ip+1
+
+@sim_op(OP.PRINT_NL)
+def sim_print_nl(m: simState, x: OpType, ip: int) -> int:
+    m.out.write('\n')
+    return ip+1
+
+@sim_op(OP.PRINT_AND_NL)
+def sim_print_and_nl(m: simState, x: OpType, ip: int) -> int:
+    m.out.write(str(m.stack[m.depth[ip]-1]))
+    m.out.write('\n')
+    return ip+1
+
+@sim_op(OP.PRINT_CHAR)
+def sim_print_char(m: simState, x: OpType, ip: int) -> int:
+    m.out.write(chr(m.stack[m.depth[ip]-1]))
+    return ip+1
+
+@sim_op(OP.BUF)
+def sim_buf(m: simState, x: OpType, ip: int) -> int:
+    if ComState.VARDEF not in m.state:
+        error(Error.SIMULATE, "Buf used in wrong position")
+    match m.types[m.temp1]:
+        case DT.UINT8MEM:
+            a = m.stack[m.depth[ip]-1]
+        case DT.UINT16MEM:
+            a = m.stack[m.depth[ip]-1] * 2
+    m.values[m.temp1] = m.heap.pointer(m.heap_end)
+    m.heap.buf(m.heap_end, a)
+    m.heap_end += a
+    m.state = ComState.NONE
+    return ip+1
+
+@sim_op(OP.VAR)
+def sim_var(m: simState, x: OpType, ip: int) -> int:
+    slot = x.value[2]
+    if ComState.ARITHMETIC not in m.state and ComState.CONDITION not in m.state:
+        m.temp1 = slot
+    m.stack[m.depth[ip]] = m.values[slot]
+    return ip+1
+
+@sim_op(OP.SET)
+def sim_set(m: simState, x: OpType, ip: int) -> int:
+    m.state = ComState.VARDEF | ComState.ARITHMETIC
+    return ip+1
+
+@sim_op(OP.DOS)
+def sim_dos_op(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]-1
+    a = m.stack[sp]
+    sim_dos(m, a, tuple(m.stack[sp-dos_arity.get(a, 0):sp][::-1]))
+    return ip+1
+
+@sim_op(OP.LINUX)
+def sim_linux_op(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]-1
+    a = m.stack[sp]
+    n = linux_arity.get(a, 0)
+    r = sim_linux(m, a, tuple(m.stack[sp-n:sp][::-1]))
+    if a in linux_results:
+        m.stack[sp-n] = r
+    return ip+1
+
+@sim_op(OP.MEMWRITE8)
+def sim_memwrite8(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]
+    m.heap[m.stack[sp-2]] = m.stack[sp-1] & 0xFF
+    return ip+1
+
+@sim_op(OP.MEMWRITE16)
+def sim_memwrite16(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]
+    b = m.stack[sp-2]
+    m.heap[b:b+2] = (m.stack[sp-1] & 0xFFFF).to_bytes(2)
+    return ip+1
+
+@sim_op(OP.MEMREAD8)
+def sim_memread8(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]-1
+    m.stack[sp] = m.heap[m.stack[sp]]
+    return ip+1
+
+@sim_op(OP.MEMREAD16)
+def sim_memread16(m: simState, x: OpType, ip: int) -> int:
+    sp = m.depth[ip]-1
+    a = m.stack[sp]
+    m.stack[sp] = int.from_bytes(m.heap[a:a+2])
+    return ip+1
+
+@sim_op(OP.MEMWRITE, OP.MEMREAD)
+def sim_unspecialized(m: simState, x: OpType, ip: int) -> int:
+    error(Error.SIMULATE, f"`{bolden(x.type.name)}` at {x.file_loc} reached the simulator without a width, Specialize_ops was not run", flags = LogFlag.FAIL)
+
+@sim_op(OP.COLON)
+def sim_colon(m: simState, x: OpType, ip: int) -> int:
+    if ComState.VARDEF in m.state:
+        m.values[m.temp1] = m.stack[m.depth[ip]-1] & m.masks[m.temp1]
+    m.state = ComState.NONE
+    return ip+1
+
+@sim_op(OP.INC_VAR)
+def sim_inc_var(m: simState, x: OpType, ip: int) -> int:
+    f = x.value
+    m.values[f.slot] = (m.values[f.slot] + f.imm) & m.masks[f.slot]
+    m.temp1 = f.slot
+    m.state = ComState.NONE
+    return ip+1
+
+@sim_op(OP.DEC_VAR)
+def sim_dec_var(m: simState, x: OpType, ip: int) -> int:
+    f = x.value
+    m.values[f.slot] = (m.values[f.slot] - f.imm) & m.masks[f.slot]
+    m.temp1 = f.slot
+    m.state = ComState.NONE
+    return ip+1
+
+@sim_op(OP.VAR_ADD)
+def sim_var_add(m: simState, x: OpType, ip: int) -> int:
+    f = x.value
+    if ComState.ARITHMETIC not in m.state and ComState.CONDITION not in m.state:
+        m.temp1 = f.slot
+    m.stack[m.depth[ip]] = m.values[f.slot] + f.imm
+    return ip+1
+
+@sim_op(OP.VAR_SUB)
+def sim_var_sub(m: simState, x: OpType, ip: int) -> int:
+    f = x.value
+    if ComState.ARITHMETIC not in m.state and ComState.CONDITION not in m.state:
+        m.temp1 = f.slot
+    m.stack[m.depth[ip]] = m.values[f.slot] - f.imm
+    return ip+1
+
+@sim_op(OP.CMP_VAR_JUMP)
+def sim_cmp_var_jump(m: simState, x: OpType, ip: int) -> int:
+    f = x.value
+    m.state = ComState.NONE
+    return ip+1 if cond_fun[f.cond](m.values[f.slot], f.imm) else m.jumps[ip]
+
+@sim_op(OP.TYPE, OP.PTR, OP.LABEL, OP.ELSE, OP.MODE)
+def sim_nop(m: simState, x: OpType, ip: int) -> int:
+    return ip+1
+
+if (n:=[x.name for x in OP if x != OP.COUNT and sim_table[x.value] is None]):
+    error(Error.ENUM, f"{BOLD_}No simulation handler registered for `{'`, `'.join(n)}`", flags = LogFlag.FAIL)
+
+def Op_codes(data: codeBlock) -> list[int]:
+    # sim_table index of every op, CB values overlap OP values so anything that isn't an OP would run a wrong handler
+    for x in data.tokens:
+        if not isinstance(x.type, OP):
+            error(Error.SIMULATE, f"`{bolden(x.type.name)}` codeBlock at {x.file_loc} is left in the op stream, it doesn't belong to an if, else or while", flags = LogFlag.FAIL)
+    return [x.type.value for x in data.tokens]
+
+def simulate_data(data: codeBlock, out = sys.stdout, heap: pagedHeap | None = None, stdin: typing.BinaryIO | None = None, checkpoint: tuple[str, str | int] | None = None, restore: str | None = None, count: bool = False, profile: opProfile | None = None, branches: branchProfile | None = None, heap_use: heapProfile | None = None, trace: str | None = None):
+
+    # stack depth before every op is known from Analyze_stack, so the operand stack never grows or shrinks
+    m: simState = simState(heap if heap is not None else pagedHeap(), out, stdin, stack = [0] * data.max_depth, jumps = Resolve_labels(data), depth = data.depth).bind_vars(data.slots)
+    tokens = data.tokens
+    table = sim_table
+    codes: list[int] = Op_codes(data)
+    ip = 0 if restore is None else Load_checkpoint(m, data, restore)
+    end = len(tokens)
+    try:
+        if checkpoint is not None:
+            # checkpoint = (file, label name or number of ops to run), taken right before the label runs
+            (path, at) = checkpoint
+            target = -1
+            steps = at if type(at) is int else -1
+            if type(at) is str:
+                target = next((i for i, x in enumerate(tokens) if x.type == OP.LABEL and x.value == at), None)
+                if target is None:
+                    error(Error.SIMULATE, f"No label `{bolden(at)}` to take a checkpoint at", flags = LogFlag.FAIL)
+            while ip < end and ip != target and steps != 0:
+                ip = table[codes[ip]](m, tokens[ip], ip)
+                steps -= 1
+            if ip < end:
+                Save_checkpoint(m, data, ip, path)
+            else:
+                error(Error.SIMULATE, f"Program ended before the checkpoint at `{bolden(str(at))}`, nothing saved", flags = LogFlag.WARNING, exitAfter = False)
+        if count:
+            # a loop of its own, so the uncounted one doesn't pay for it
+            m.steps = 0
+            while ip < end:
+                ip = table[codes[ip]](m, tokens[ip], ip)
+                m.steps += 1
+        if profile is not None:
+            profile.tokens = tokens
+            counts = profile.counts = [0] * end
+            times = profile.times = [0] * end
+            clock = time.perf_counter_ns
+            try:
+                while ip < end:
+                    i = ip
+                    t = clock()
+                    ip = table[codes[i]](m, tokens[i], i)
+                    times[i] += clock() - t
+                    counts[i] += 1
+            finally:
+                m.steps = sum(counts)
+        if branches is not None or heap_use is not None:
+            before: list[simHook | None] = [None] * end
+            after: list[simHook | None] = [None] * end
+            for x in (branches, heap_use):
+                if x is not None:
+                    x.attach(data, before, after)
+            try:
+                while ip < end:
+                    i = ip
+                    if (h:=before[i]) is not None:
+                        h(m, i)
+                    ip = table[codes[i]](m, tokens[i], i)
+                    if (h:=after[i]) is not None:
+                        h(m, ip)
+            finally:
+                if heap_use is not None:
+                    heap_use.finish(m)
+        if trace is not None:
+            # records get packed into one buffer that is written out whenever it fills up
+            pack = TRACE_RECORD.pack_into
+            size = TRACE_RECORD.size
+            buffer = bytearray(size * TRACE_BUFFER)
+            full = len(buffer)
+            # how far below the stack depth an op finds the address it touches, 0 for ops without one
+            addr_at = [2 if x.type in (OP.MEMWRITE8, OP.MEMWRITE16) else 1 if x.type in (OP.MEMREAD8, OP.MEMREAD16) else 0 for x in tokens]
+            (stack, depth) = (m.stack, m.depth + [0])
+            o = 0
+            with open(trace, 'wb') as f:
+                Trace_header(f, data)
+                try:
+                    while ip < end:
+                        i = ip
+                        a = addr_at[i]
+                        addr = stack[depth[i]-a] if a else TRACE_NO_ADDR
+                        ip = table[codes[i]](m, tokens[i], i)
+                        d = depth[ip]
+                        pack(buffer, o, i, codes[i], stack[d-1] & 0xFFFFFFFF if d else 0, addr)
+                        o += size
+                        if o == full:
+                            f.write(buffer)
+                            o = 0
+                finally:
+                    f.write(memoryview(buffer)[:o])
+        while ip < end:
+            ip = table[codes[ip]](m, tokens[ip], ip)
+    except HeapError as e:
+        error(Error.SIMULATE, f"{e}, in `{bolden(tokens[ip].type.name)}` at {tokens[ip].file_loc}", flags = LogFlag.FAIL)
+    return m
+
+async def simulate_async(data: codeBlock, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, heap: pagedHeap | None = None, budget: int | None = None, quantum: int = 10000) -> simState:
+
+    # the standard engine run in slices of `quantum` ops, handing the event loop back after every slice and on every dos/linux call,
+    # input calls first wait for the client to send something and output goes out to it after every slice
+    out = io.StringIO()
+    m: simState = simState(heap if heap is not None else pagedHeap(), out, stack = [0] * data.max_depth, jumps = Resolve_labels(data), depth = data.depth).bind_vars(data.slots)
+    tokens = data.tokens
+    table = sim_table
+    codes: list[int] = Op_codes(data)
+    calls: list[bool] = [x.type in (OP.DOS, OP.LINUX) for x in tokens]
     ip = 0
-    state: ComState = ComState.NONE
-    temp1: str = ""
-    condition: OP
-    last_type: DT
-    debug_counter = -1
-    while ip < len(data.tokens):
-        debug_counter += 1
-        x = data.tokens[ip]
+    end = len(tokens)
+    steps = 0
+    try:
+        while ip < end:
+            stop = steps + quantum if budget is None else min(steps + quantum, budget)
+            while ip < end and steps < stop and not calls[ip]:
+                ip = table[codes[ip]](m, tokens[ip], ip)
+                steps += 1
+            if ip < end and steps < stop:
+                sp = m.depth[ip]-1
+                if tokens[ip].type == OP.DOS and m.stack[sp] == 10:
+                    m.stdin = io.BytesIO(await reader.readline())
+                elif tokens[ip].type == OP.LINUX and m.stack[sp] == 0 and m.stack[sp-1] == 0:
+                    m.stdin = io.BytesIO(await reader.read(m.stack[sp-3]))
+                ip = table[codes[ip]](m, tokens[ip], ip)
+                steps += 1
+            if out.tell():
+                writer.write(out.getvalue().encode('latin-1'))
+                out.seek(0)
+                out.truncate()
+                await writer.drain()
+            if budget is not None and steps >= budget and ip < end:
+                raise BudgetError(f"Instruction budget of {budget} ops used up, in `{tokens[ip].type.name}` at {tokens[ip].file_loc}")
+            await asyncio.sleep(0)
+    except HeapError as e:
+        raise HeapError(f"{e}, in `{tokens[ip].type.name}` at {tokens[ip].file_loc}") from None
+    finally:
+        m.close()
+    return m
+
+def Thread_op(data: codeBlock, m: simState, x: OpType, ip: int, target: int, condition: OP | None) -> typing.Callable[[], int]:
+
+    # every handler does the work of a single op and returns the index of the next one to run
+    stack = m.stack
+    heap = m.heap
+    values = m.values
+    masks = m.masks
+    types = m.types
+    push = stack.append
+    pop = stack.pop
+    nxt = ip + 1
+
+    match x.type:
+        case OP.NUM:
+            value = int(x.value)
+            def h() -> int:
+                push(value)
+                return nxt
+        case OP.STRING:
+            string = x.value
+            def h() -> int:
+                if ComState.VARDEF in m.state:
+                    match types[m.temp1]:
+                        case DT.UINT8MEM:
+                            for y in range(len(string)):
+                                heap[m.heap_end+y] = ord(string[y])
+                            heap[m.heap_end+len(string)] = ord('$')
+                            values[m.temp1] = heap.pointer(m.heap_end)
+                            m.heap_end += len(string)+1
+                        case DT.UINT16MEM:
+                            for y in range(len(string)):
+                                heap[m.heap_end+y*2] = ord(string[y])
+                            heap[m.heap_end+len(string)*2] = ord('$')
+                            values[m.temp1] = heap.pointer(m.heap_end)
+                            m.heap_end += (len(string)+1)*2
+                    m.state = ComState.NONE
+                else:
+                    for y in range(len(string)):
+                        heap[m.heap_end+y] = ord(string[y])
+                    heap[m.heap_end+len(string)] = ord('$')
+                    push(heap.pointer(m.heap_end))
+                    m.heap_end += len(string)+1
+                return nxt
+        case x_type if x_type in binary_fun:
+            fun = binary_fun[x_type]
+            def h() -> int:
+                a = pop()
+                push(fun(pop(), a))
+                return nxt
+        case OP.IF | OP.WHILE:
+            def h() -> int:
+                m.state = ComState.CONDITION
+                return nxt
+        case OP.CONJUMP:
+            if condition is None:
+                error(Error.PARSE, f"CONJUMP at `{ip}` without a preceding condition", flags = LogFlag.FAIL)
+            test = cond_fun[condition]
+            def h() -> int:
+                a = pop()
+                b = pop()
+                m.state = ComState.NONE
+                return nxt if test(b, a) else target
+        case OP.JUMP:
+            def h() -> int:
+                m.state = ComState.NONE
+                return target
+        case OP.COPY:
+            def h() -> int:
+                push(stack[-1])
+                return nxt
+        case OP.PRINT:
+            def h() -> int:
+                m.out.write(str(pop()))
+                return nxt
+        case OP.PRINT_NL:
+            def h() -> int:
+                m.out.write('\n')
+                return nxt
+        case OP.PRINT_AND_NL:
+            def h() -> int:
+                m.out.write(str(pop()))
+                m.out.write('\n')
+                return nxt
+        case OP.PRINT_CHAR:
+            def h() -> int:
+                m.out.write(chr(pop()))
+                return nxt
+        case OP.BUF:
+            def h() -> int:
+                if ComState.VARDEF not in m.state:
+                    error(Error.SIMULATE, "Buf used in wrong position")
+                match types[m.temp1]:
+                    case DT.UINT8MEM:
+                        a = pop()
+                    case DT.UINT16MEM:
+                        a = pop() * 2
+                values[m.temp1] = heap.pointer(m.heap_end)
+                heap.buf(m.heap_end, a)
+                m.heap_end += a
+                m.state = ComState.NONE
+                return nxt
+        case OP.VAR:
+            slot = x.value[2]
+            def h() -> int:
+                if ComState.ARITHMETIC not in m.state and ComState.CONDITION not in m.state:
+                    m.temp1 = slot
+                push(values[slot])
+                return nxt
+        case OP.SET:
+            def h() -> int:
+                m.state = ComState.VARDEF | ComState.ARITHMETIC
+                pop()
+                return nxt
+        case OP.DOS:
+            def h() -> int:
+                a = pop()
+                sim_dos(m, a, tuple(pop() for _ in range(dos_arity.get(a, 0))))
+                return nxt
+        case OP.LINUX:
+            def h() -> int:
+                a = pop()
+                r = sim_linux(m, a, tuple(pop() for _ in range(linux_arity.get(a, 0))))
+                if a in linux_results:
+                    push(r)
+                return nxt
+        case OP.MEMWRITE8:
+            def h() -> int:
+                a = pop()
+                heap[pop()] = a & 0xFF
+                return nxt
+        case OP.MEMWRITE16:
+            def h() -> int:
+                a = pop()
+                b = pop()
+                heap[b:b+2] = (a & 0xFFFF).to_bytes(2)
+                return nxt
+        case OP.MEMREAD8:
+            def h() -> int:
+                push(heap[pop()])
+                return nxt
+        case OP.MEMREAD16:
+            def h() -> int:
+                a = pop()
+                push(int.from_bytes(heap[a:a+2]))
+                return nxt
+        case OP.MEMWRITE | OP.MEMREAD:
+            error(Error.SIMULATE, f"`{bolden(x.type.name)}` at {x.file_loc} has no width, Specialize_ops was not run", flags = LogFlag.FAIL)
+        case OP.INC_VAR | OP.DEC_VAR:
+            slot = x.value.slot
+            mask = masks[slot]
+            imm = x.value.imm if x.type == OP.INC_VAR else -x.value.imm
+            def h() -> int:
+                values[slot] = (values[slot] + imm) & mask
+                m.temp1 = slot
+                m.state = ComState.NONE
+                return nxt
+        case OP.VAR_ADD | OP.VAR_SUB:
+            slot = x.value.slot
+            imm = x.value.imm if x.type == OP.VAR_ADD else -x.value.imm
+            def h() -> int:
+                if ComState.ARITHMETIC not in m.state and ComState.CONDITION not in m.state:
+                    m.temp1 = slot
+                push(values[slot] + imm)
+                return nxt
+        case OP.CMP_VAR_JUMP:
+            slot = x.value.slot
+            imm = x.value.imm
+            test = cond_fun[x.value.cond]
+            def h() -> int:
+                m.state = ComState.NONE
+                return nxt if test(values[slot], imm) else target
+        case OP.COLON:
+            def h() -> int:
+                if ComState.VARDEF in m.state:
+                    values[m.temp1] = pop() & masks[m.temp1]
+                m.state = ComState.NONE
+                return nxt
+        case _:
+            # conditions are bound into their CONJUMP, labels and the rest have nothing to do at run time
+            def h() -> int:
+                return nxt
+    return h
+
+def Thread_code(data: codeBlock, m: simState) -> list[typing.Callable[[], int]]:
+
+    if (n:=OP.COUNT.value) != (m_:=46):
+        error(Error.ENUM, f"{BOLD_}Exhaustive operation threading protection in {BOLD_}Thread_code{BACK_}", expected = (m_,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
+
+    jumps: list[int] = Resolve_labels(data)
+    handlers: list[typing.Callable[[], int]] = []
+    condition: OP | None = None
+    for ip, x in enumerate(data.tokens):
+        if x.type in condition_ops:
+            condition = x.type
+        handlers.append(Thread_op(data, m, x, ip, jumps[ip], condition))
+    return handlers
+
+def simulate_threaded(data: codeBlock, out = sys.stdout, heap: pagedHeap | None = None, stdin: typing.BinaryIO | None = None):
+
+    m: simState = simState(heap if heap is not None else pagedHeap(), out, stdin).bind_vars(data.slots)
+    handlers = Thread_code(data, m)
+    end = len(handlers)
+    ip = 0
+    try:
+        while ip < end:
+            ip = handlers[ip]()
+    except HeapError as e:
+        error(Error.SIMULATE, f"{e}, in `{bolden(data.tokens[ip].type.name)}` at {data.tokens[ip].file_loc}", flags = LogFlag.FAIL)
+    return m
+
+# ------------------------------------------------------
+# ----------------- TRANSPILE SECTION ------------------
+# ------------------------------------------------------
+
+# bump when generated modules change, so stale __mandcache__ entries stop matching
+TRANSPILE_VERSION = 8
+
+class TranspileFallback(Exception):
+    pass
+
+@dataclass
+class transpileState:
+    stack:      list[str] = field(default_factory=list)
+    # None marks a value that differs between the paths merging at this point
+    state:      ComState | None = ComState.NONE
+    temp1:      int | None = -1
+    condition:  OP | None = None
+
+    def copy(self) -> typing.Self:
+        return transpileState(self.stack.copy(), self.state, self.temp1, self.condition)
+
+    def merge(self, other: typing.Self) -> typing.Self:
+        if self.stack != other.stack:
+            raise TranspileFallback("stack differs between merging paths")
+        return transpileState(
+            self.stack.copy(),
+            self.state if self.state == other.state else None,
+            self.temp1 if self.temp1 == other.temp1 else None,
+            self.condition if self.condition == other.condition else None,
+        )
+
+binary_sym: dict[OP, str] = {
+    OP.ADD  : "+",
+    OP.SUB  : "-",
+    OP.MUL  : "*",
+    OP.DIV  : "//",
+    OP.MOD  : "%",
+    OP.SHL  : "<<",
+    OP.SHR  : ">>",
+}
+
+cond_sym: dict[OP, str] = {
+    OP.EQUAL    : "==",
+    OP.GREATER  : ">",
+    OP.LESS     : "<",
+    OP.GE       : ">=",
+    OP.LE       : "<=",
+}
+
+def is_literal(expr: str) -> bool:
+    return expr.lstrip('-').isdigit()
+
+def is_stable(expr: str) -> bool:
+    return is_literal(expr) or expr.startswith("_t")
+
+def masked(expr: str, mask: int) -> str:
+    return str(int(expr) & mask) if is_literal(expr) else f"{expr} & {mask:#x}"
+
+class Transpiler:
+
+    def __init__(self, data: codeBlock):
+        self.data = data
+        # generated Python gets nothing out of superinstructions, structure recovery works on the plain ops
+        self.tokens = Expand_fused(data.tokens)
+        self.jumps = Resolve_labels(codeBlock(data.id, self.tokens, data.vars))
+        self.temp_count = 0
+        self.locals: dict[int, str] = {}
+
+    def fail(self, ip: int, reason: str) -> typing.NoReturn:
+        raise TranspileFallback(f"{reason} at `{ip}`")
+
+    def local(self, ip: int, slot: int) -> str:
+        if not 0 <= slot < len(self.data.slots):
+            self.fail(ip, "variable without a slot")
+        if slot not in self.locals:
+            name = self.data.slots[slot].name
+            self.locals[slot] = f"_v{slot}_{name}" if name.isidentifier() else f"_v{slot}"
+        return self.locals[slot]
+
+    def temp(self) -> str:
+        self.temp_count += 1
+        return f"_t{self.temp_count}"
+
+    def pop(self, ip: int, st: transpileState) -> str:
+        if not st.stack:
+            self.fail(ip, "operand stack underflow")
+        return st.stack.pop()
+
+    def stable(self, expr: str, lines: list[str], pad: str) -> str:
+        if is_stable(expr):
+            return expr
+        t = self.temp()
+        lines.append(f"{pad}{t} = {expr}")
+        return t
+
+    def flush(self, st: transpileState, lines: list[str], pad: str) -> None:
+        # everything still on the stack gets evaluated before the next side effect
+        for i, expr in enumerate(st.stack):
+            st.stack[i] = self.stable(expr, lines, pad)
+
+    def mask(self, ip: int, slot: int | None) -> int:
+        if slot is None or slot < 0:
+            self.fail(ip, "statement target is not known statically")
+        return 0xFF if self.data.slots[slot].type == DT.UINT8 else 0xFFFF
+
+    def emit_op(self, ip: int, x: OpType, st: transpileState, lines: list[str], pad: str) -> None:
+        stack = st.stack
         match x.type:
             case OP.NUM:
-                stack.append(int(x.value))
+                stack.append(str(int(x.value)))
+            case x_type if x_type in binary_sym:
+                a = self.pop(ip, st)
+                b = self.pop(ip, st)
+                if is_literal(a) and is_literal(b) and not (x_type in (OP.DIV, OP.MOD) and int(a) == 0) and not (x_type in (OP.SHL, OP.SHR) and not 0 <= int(a) <= 64):
+                    stack.append(str(binary_fun[x_type](int(b), int(a))))
+                else:
+                    stack.append(f"({b} {binary_sym[x_type]} {a})")
             case OP.STRING:
-                if ComState.VARDEF in state:
-                    match data.vars[temp1].type:
+                raw = [ord(c) for c in x.value]
+                if any(c > 255 for c in raw):
+                    self.fail(ip, "string literal outside of a single byte range")
+                if st.state is None:
+                    self.fail(ip, "string literal in unknown statement state")
+                self.flush(st, lines, pad)
+                if ComState.VARDEF in st.state:
+                    var = self.local(ip, st.temp1) if st.temp1 is not None else self.fail(ip, "unknown string target")
+                    match self.data.slots[st.temp1].type:
                         case DT.UINT8MEM:
-                            for y in range(len(x.value)):
-                                heap[heap_end+y] = ord(x.value[y])
-                            heap[heap_end+len(x.value)] = ord('$')
-                            data.vars[temp1].value = bytearray(bfromNum(data.vars[temp1].type, heap_end))
-                            heap_end += len(x.value)+1
+                            lines.append(f"{pad}heap[heap_end:heap_end+{len(raw)+1}] = {bytes(raw + [ord('$')])!r}")
+                            lines.append(f"{pad}{var} = heap.pointer(heap_end)")
+                            lines.append(f"{pad}heap_end += {len(raw)+1}")
                         case DT.UINT16MEM:
-                            for y in range(len(x.value)):
-                                heap[heap_end+y*2] = ord(x.value[y])
-                            heap[heap_end+len(x.value)*2] = ord('$')
-                            data.vars[temp1].value = bytearray(bfromNum(data.vars[temp1].type, heap_end))
-                            heap_end += (len(x.value)+1)*2
-                    state = ComState.NONE
+                            if raw:
+                                lines.append(f"{pad}heap[heap_end:heap_end+{len(raw)*2}:2] = {bytes(raw)!r}")
+                            lines.append(f"{pad}heap[heap_end+{len(raw)*2}] = {ord('$')}")
+                            lines.append(f"{pad}{var} = heap.pointer(heap_end)")
+                            lines.append(f"{pad}heap_end += {(len(raw)+1)*2}")
+                    st.state = ComState.NONE
                 else:
-                    for y in range(len(x.value)):
-                        heap[heap_end+y] = ord(x.value[y])
-                    heap[heap_end+len(x.value)] = ord('$')
-                    stack.append(int.from_bytes(bfromNum(data.vars[temp1].type, heap_end)))
-                    heap_end += len(x.value)+1
-            case OP.ADD:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b+a)
-            case OP.SUB:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b-a)
-            case OP.MUL:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b*a)
-            case OP.DIV:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b // a)
-            case OP.MOD:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b%a)
-            case OP.SHL:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b<<a)
-            case OP.SHR:
-                a = stack.pop()
-                b = stack.pop()
-                stack.append(b>>a)
-            case OP.IF:
-                state = ComState.CONDITION
-            case OP.WHILE:
-                state = ComState.CONDITION
-            case OP.EQUAL:
-                condition = x.type
-            case OP.GREATER:
-                condition = x.type
-            case OP.LESS:
-                condition = x.type
-            case OP.GE:
-                condition = x.type
-            case OP.LE:
-                condition = x.type
-            case OP.CONJUMP:
-                a = stack.pop()
-                b = stack.pop()
-                state = ComState.NONE
-                match condition:
-                    case OP.EQUAL:
-                        if not b == a:
-                            ipx = ip
-                            while ipx < len(data.tokens):
-                                if (n:=data.tokens[ipx]).type == OP.LABEL and n.value[5:] == x.value[5:]:
-                                    ip = ipx
-                                    break
-                                ipx += 1
-                            continue
-                    case OP.GREATER:
-                        if not b > a:
-                            ipx = ip
-                            while ipx < len(data.tokens):
-                                if (n:=data.tokens[ipx]).type == OP.LABEL and n.value[5:] == x.value[5:]:
-                                    ip = ipx
-                                    break
-                                ipx += 1
-                            continue
-                    case OP.LESS:
-                        if not b < a:
-                            ipx = ip
-                            while ipx < len(data.tokens):
-                                if (n:=data.tokens[ipx]).type == OP.LABEL and n.value[5:] == x.value[5:]:
-                                    ip = ipx
-                                    break
-                                ipx += 1
-                            continue
-                    case OP.GE:
-                        if not b >= a:
-                            ipx = ip
-                            while ipx < len(data.tokens):
-                                if (n:=data.tokens[ipx]).type == OP.LABEL and n.value[5:] == x.value[5:]:
-                                    ip = ipx
-                                    break
-                                ipx += 1
-                            continue
-                    case OP.LE:
-                        if not b <= a:
-                            ipx = ip
-                            while ipx < len(data.tokens):
-                                if (n:=data.tokens[ipx]).type == OP.LABEL and n.value[5:] == x.value[5:]:
-                                    ip = ipx
-                                    break
-                                ipx += 1
-                            continue
-            case OP.JUMP:
-                ip = int(x.value[5:])
-                state = ComState.NONE
-                continue
+                    t = self.temp()
+                    lines.append(f"{pad}heap[heap_end:heap_end+{len(raw)+1}] = {bytes(raw + [ord('$')])!r}")
+                    lines.append(f"{pad}{t} = heap.pointer(heap_end)")
+                    lines.append(f"{pad}heap_end += {len(raw)+1}")
+                    stack.append(t)
+            case OP.IF | OP.WHILE:
+                st.state = ComState.CONDITION
+            case x_type if x_type in condition_ops:
+                st.condition = x_type
             case OP.COPY:
-                a = stack.pop()
+                a = self.stable(self.pop(ip, st), lines, pad)
                 stack.append(a)
                 stack.append(a)
-            case OP.PRINT:
-                a = stack.pop()
-                out.write(str(a))
+            case OP.PRINT | OP.PRINT_AND_NL | OP.PRINT_CHAR:
+                a = self.pop(ip, st)
+                self.flush(st, lines, pad)
+                match x.type:
+                    case OP.PRINT:
+                        lines.append(f"{pad}out.write(str({a}))")
+                    case OP.PRINT_AND_NL:
+                        lines.append(f"{pad}out.write(str({a}))")
+                        lines.append(f"{pad}out.write('\\n')")
+                    case OP.PRINT_CHAR:
+                        lines.append(f"{pad}out.write(chr({a}))")
             case OP.PRINT_NL:
-                out.write('\n')
-            case OP.PRINT_AND_NL:
-                a = stack.pop()
-                out.write(str(a))
-                out.write('\n')
-            case OP.PRINT_CHAR:
-                a = stack.pop()
-                out.write(chr(a))
-            case OP.TYPE:
-                pass
+                self.flush(st, lines, pad)
+                lines.append(f"{pad}out.write('\\n')")
             case OP.BUF:
+                if st.state is None or ComState.VARDEF not in st.state or st.temp1 is None:
+                    self.fail(ip, "buf outside of a known definition")
+                var = self.local(ip, st.temp1)
+                match self.data.slots[st.temp1].type:
+                    case DT.UINT8MEM:
+                        a = self.pop(ip, st)
+                    case DT.UINT16MEM:
+                        a = self.pop(ip, st)
+                        a = str(int(a) * 2) if is_literal(a) else f"({a} * 2)"
+                    case _:
+                        self.fail(ip, "buf assigned to a non pointer variable")
+                self.flush(st, lines, pad)
+                a = self.stable(a, lines, pad)
+                lines.append(f"{pad}{var} = heap.pointer(heap_end)")
+                lines.append(f"{pad}heap.buf(heap_end, {a})")
+                lines.append(f"{pad}heap_end += {a}")
+                st.state = ComState.NONE
+            case OP.VAR:
+                var = self.local(ip, x.value[2])
+                if st.state is None:
+                    st.temp1 = None
+                elif ComState.ARITHMETIC not in st.state and ComState.CONDITION not in st.state:
+                    st.temp1 = x.value[2]
+                stack.append(var)
+            case OP.SET:
+                st.state = ComState.VARDEF | ComState.ARITHMETIC
+                self.pop(ip, st)
+            case OP.DOS | OP.LINUX:
+                a = self.pop(ip, st)
+                if not is_literal(a):
+                    self.fail(ip, f"{x.type.name} call number is not a literal")
+                arity = (dos_arity if x.type == OP.DOS else linux_arity).get(int(a), 0)
+                args = [self.pop(ip, st) for _ in range(arity)]
+                self.flush(st, lines, pad)
+                call = f"{'dos' if x.type == OP.DOS else 'linux'}(m, {a}, ({''.join(arg + ', ' for arg in args)}))"
+                if x.type == OP.LINUX and int(a) in linux_results:
+                    t = self.temp()
+                    lines.append(f"{pad}{t} = {call}")
+                    stack.append(t)
+                else:
+                    lines.append(f"{pad}{call}")
+            case OP.MEMWRITE8:
+                a = self.pop(ip, st)
+                b = self.pop(ip, st)
+                self.flush(st, lines, pad)
+                lines.append(f"{pad}heap[{b}] = {masked(a, 0xFF)}")
+            case OP.MEMWRITE16:
+                a = self.pop(ip, st)
+                b = self.pop(ip, st)
+                self.flush(st, lines, pad)
+                b = self.stable(b, lines, pad)
+                lines.append(f"{pad}heap[{b}:{b}+2] = ({masked(a, 0xFFFF)}).to_bytes(2, 'big')")
+            case OP.MEMREAD8:
+                stack.append(f"heap[{self.pop(ip, st)}]")
+            case OP.MEMREAD16:
+                a = self.stable(self.pop(ip, st), lines, pad)
+                stack.append(f"int.from_bytes(heap[{a}:{a}+2])")
+            case OP.MEMWRITE | OP.MEMREAD:
+                self.fail(ip, f"{x.type.name} without a width")
+            case OP.COLON:
+                if st.state is None:
+                    self.fail(ip, "statement end in unknown state")
+                if ComState.VARDEF in st.state:
+                    a = self.pop(ip, st)
+                    if st.temp1 is None:
+                        self.fail(ip, "assignment target is not known statically")
+                    self.flush(st, lines, pad)
+                    lines.append(f"{pad}{self.local(ip, st.temp1)} = {masked(a, self.mask(ip, st.temp1))}")
+                st.state = ComState.NONE
+            case OP.CONJUMP | OP.JUMP | OP.LABEL:
+                self.fail(ip, f"unstructured {x.type.name}")
+            case _:
+                pass
+
+    def test(self, ip: int, st: transpileState) -> str:
+        a = self.pop(ip, st)
+        b = self.pop(ip, st)
+        if st.condition is None:
+            self.fail(ip, "condition is not known statically")
+        st.state = ComState.NONE
+        return f"{b} {cond_sym[st.condition]} {a}"
+
+    def emit_loop(self, ip: int, hi: int, st: transpileState, lines: list[str], pad: str) -> tuple[int, transpileState]:
+        # LABEL a, WHILE, <condition>, CONJUMP b, <body>, JUMP a, LABEL b
+        back = next((j for j in range(ip+1, hi) if self.tokens[j].type == OP.JUMP and self.jumps[j] == ip), -1)
+        if back == -1 or back+1 >= hi or self.tokens[back+1].type != OP.LABEL:
+            self.fail(ip, "label is not the head of a while loop")
+        cond = ip+1
+        while self.tokens[cond].type not in (OP.CONJUMP, OP.JUMP, OP.LABEL):
+            cond += 1
+        if self.tokens[cond].type != OP.CONJUMP or self.jumps[cond] != back+1:
+            self.fail(ip, "while loop without a leading exit condition")
+
+        self.flush(st, lines, pad)
+        entry = st.copy()
+        while True:
+            head: list[str] = []
+            body: list[str] = []
+            s = entry.copy()
+            for i in range(ip+1, cond):
+                self.emit_op(i, self.tokens[i], s, head, pad + "    ")
+            test = self.test(cond, s)
+            exit_state = s.copy()
+            self.flush(s, head, pad + "    ")
+            self.emit_range(cond+1, back, s, body, pad + "    ")
+            s.state = ComState.NONE
+            merged = entry.merge(s)
+            if merged == entry:
+                break
+            entry = merged
+        if exit_state.stack != entry.stack:
+            self.fail(ip, "while condition leaves values on the stack")
+
+        if head:
+            lines.append(f"{pad}while True:")
+            lines += head
+            lines.append(f"{pad}    if not ({test}):")
+            lines.append(f"{pad}        break")
+        else:
+            lines.append(f"{pad}while {test}:")
+        lines += body if body or head else [f"{pad}    pass"]
+        return (back+2, exit_state)
+
+    def emit_branch(self, ip: int, hi: int, st: transpileState, lines: list[str], pad: str) -> tuple[int, transpileState]:
+        # CONJUMP a, <then>, LABEL a  |  CONJUMP a, <then>, JUMP b, LABEL a, <else>, LABEL b
+        test = self.test(ip, st)
+        self.flush(st, lines, pad)
+        label = self.jumps[ip]
+        if not ip < label < hi:
+            self.fail(ip, "conditional jump outside of its block")
+
+        then_lines: list[str] = []
+        then_state = st.copy()
+        if self.tokens[label-1].type == OP.JUMP and label < (end := self.jumps[label-1]) < hi:
+            self.emit_range(ip+1, label-1, then_state, then_lines, pad + "    ")
+            then_state.state = ComState.NONE
+            else_lines: list[str] = []
+            else_state = st.copy()
+            self.emit_range(label+1, end, else_state, else_lines, pad + "    ")
+            lines.append(f"{pad}if {test}:")
+            lines += then_lines or [f"{pad}    pass"]
+            if else_lines:
+                lines.append(f"{pad}else:")
+                lines += else_lines
+            return (end+1, then_state.merge(else_state))
+
+        self.emit_range(ip+1, label, then_state, then_lines, pad + "    ")
+        if then_lines:
+            lines.append(f"{pad}if {test}:")
+            lines += then_lines
+        return (label+1, st.merge(then_state))
+
+    def emit_range(self, lo: int, hi: int, st: transpileState, lines: list[str], pad: str) -> None:
+        depth = len(st.stack)
+        ip = lo
+        while ip < hi:
+            x = self.tokens[ip]
+            match x.type:
+                case OP.LABEL:
+                    (ip, end_state) = self.emit_loop(ip, hi, st, lines, pad)
+                case OP.CONJUMP:
+                    (ip, end_state) = self.emit_branch(ip, hi, st, lines, pad)
+                case _:
+                    first = len(lines)
+                    self.emit_op(ip, x, st, lines, pad)
+                    # so run time errors in the generated module can point back at the source
+                    for n in range(first, len(lines)):
+                        lines[n] += f"  # @ {x.file_loc}"
+                    ip += 1
+                    continue
+            st.stack[:] = end_state.stack
+            st.state = end_state.state
+            st.temp1 = end_state.temp1
+            st.condition = end_state.condition
+            if len(st.stack) < depth:
+                self.fail(ip, "block consumes values from outside of itself")
+
+    def module(self, src_name: str, digest: str) -> str:
+        body: list[str] = []
+        st = transpileState()
+        self.emit_range(0, len(self.tokens), st, body, "    ")
+        self.flush(st, body, "    ")
+        head: list[str] = [
+            f"# generated by mandarine.py from {src_name}, do not edit",
+            f"# source sha256 {digest}",
+            "",
+            "def run(m, dos, linux):",
+            "    heap = m.heap",
+            "    out = m.out",
+            "    heap_end = m.heap_end",
+        ]
+        head += [f"    {var} = 0" for var in self.locals.values()]
+        tail: list[str] = [f"    m.stack[:0] = [{', '.join(st.stack)}]"] if st.stack else []
+        tail.append("    m.heap_end = heap_end")
+        return "\n".join(head + body + tail) + "\n"
+
+def transpile_data(data: codeBlock, src_name: str = "<memory>", digest: str = "") -> str:
+    return Transpiler(data).module(src_name, digest)
+
+def Transpile_file(in_path: str) -> types.ModuleType | None:
+
+    with open(in_path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    key = hashlib.sha256(f"{TRANSPILE_VERSION}:".encode() + source).hexdigest()[:16]
+    cache_dir = os.path.join(os.path.dirname(in_path), "__mandcache__")
+    base = os.path.splitext(os.path.basename(in_path))[0]
+    cache_path = os.path.join(cache_dir, f"{base}.{key}.py")
+
+    if not os.path.isfile(cache_path):
+        try:
+            code = transpile_data(Parse_file(in_path), in_path, digest)
+        except TranspileFallback as e:
+            # remembered, so later runs don't try again until the source changes
+            code = f"# {in_path} could not be transpiled: {e}\nrun = None\n"
+        try:
+            os.makedirs(cache_dir, exist_ok = True)
+            for stale in glob.glob(os.path.join(glob.escape(cache_dir), f"{glob.escape(base)}.*.py")):
+                os.remove(stale)
+            with open(cache_path + ".tmp", 'wt', encoding='utf-8') as f:
+                f.write(code)
+            os.replace(cache_path + ".tmp", cache_path)
+        except OSError as e:
+            # a source directory that can't be written to still runs, the module just isn't kept for the next run
+            error(Error.SIMULATE, f"Can't cache the transpiled module in {bolden(cache_dir)} ({e.strerror}), running it from memory", flags = LogFlag.WARNING, exitAfter = False)
+            module = Module_from_source(code, f"__mandcache__.{base}_{key}")
+            return module if module.run is not None else None
+
+    spec = importlib.util.spec_from_file_location(f"__mandcache__.{base}_{key}", cache_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module if module.run is not None else None
+
+def Module_from_source(code: str, name: str) -> types.ModuleType:
+    # a generated module that never touches the disk, linecache keeps its source so errors still find their file_loc
+    module = types.ModuleType(name)
+    module.__file__ = f"<{name}>"
+    linecache.cache[module.__file__] = (len(code), None, code.splitlines(True), module.__file__)
+    exec(compile(code, module.__file__, 'exec'), module.__dict__)
+    return module
+
+def simulate_transpiled(data: codeBlock, out = sys.stdout, heap: pagedHeap | None = None, stdin: typing.BinaryIO | None = None):
+
+    # an already parsed program has no source to key __mandcache__ on, so its module only lives in memory,
+    # Prepare_file goes through Transpile_file instead when it has the source
+    try:
+        code = transpile_data(data)
+    except TranspileFallback as e:
+        error(Error.SIMULATE, f"Program can't be transpiled ({e}), using the threaded engine", flags = LogFlag.WARNING, exitAfter = False)
+        return simulate_threaded(data, out, heap, stdin)
+    return simulate_module(Module_from_source(code, f"__mandcache__.{Program_digest(data)}"), out, heap, stdin)
+
+def simulate_module(module: types.ModuleType, out = sys.stdout, heap: pagedHeap | None = None, stdin: typing.BinaryIO | None = None):
+
+    m: simState = simState(heap if heap is not None else pagedHeap(), out, stdin)
+    try:
+        module.run(m, sim_dos, sim_linux)
+    except HeapError as e:
+        # every generated line ends with the file_loc of the op it came from
+        loc = "an unknown location"
+        tb = e.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == module.__file__:
+                loc = linecache.getline(module.__file__, tb.tb_lineno).rpartition("# @ ")[2].strip() or loc
+            tb = tb.tb_next
+        error(Error.SIMULATE, f"{e}, at {loc}", flags = LogFlag.FAIL)
+    return m
+
+# ------------------------------------------------------
+# ----------------- BYTECODE SECTION -------------------
+# ------------------------------------------------------
+
+BYTECODE_MAGIC = b"MANDBC\x03"
+
+@dataclass
+class byteCode:
+    # one entry per op in each of the parallel arrays
+    # operand: NUM value (or index into consts when it doesn't fit), index into strings for STRING and LABEL,
+    #          variable slot for VAR (also its index into names and types), condition OP value for CONJUMP,
+    #          index into fused for superinstructions
+    # target:  op index of the LABEL for CONJUMP, JUMP and CMP_VAR_JUMP, reference count for VAR, -2 on a NUM stored in consts
+    opcode:     array.array = field(default_factory=lambda: array.array('i'))
+    operand:    array.array = field(default_factory=lambda: array.array('i'))
+    target:     array.array = field(default_factory=lambda: array.array('i'))
+    loc_file:   array.array = field(default_factory=lambda: array.array('i'))
+    loc_line:   array.array = field(default_factory=lambda: array.array('i'))
+    loc_col:    array.array = field(default_factory=lambda: array.array('i'))
+    strings:    list[str] = field(default_factory=list)
+    consts:     list[int] = field(default_factory=list)
+    files:      list[str] = field(default_factory=list)
+    names:      list[str] = field(default_factory=list)
+    types:      array.array = field(default_factory=lambda: array.array('b'))
+    # [slot, immediate, condition OP value or 0] of every superinstruction
+    fused:      list[list[int]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.opcode)
+
+    def file_loc(self, ip: int) -> tuple[str, int, int]:
+        return (self.files[self.loc_file[ip]], self.loc_line[ip], self.loc_col[ip])
+
+    def dump(self, out_path: str) -> None:
+        header = json.dumps({
+            "count"     : len(self),
+            "strings"   : self.strings,
+            "consts"    : self.consts,
+            "files"     : self.files,
+            "names"     : self.names,
+            "types"     : self.types.tolist(),
+            "fused"     : self.fused,
+        }).encode("utf-8")
+        with open(out_path, 'wb') as f:
+            f.write(BYTECODE_MAGIC)
+            f.write(len(header).to_bytes(4, 'little'))
+            f.write(header)
+            for column in (self.opcode, self.operand, self.target, self.loc_file, self.loc_line, self.loc_col):
+                if sys.byteorder != 'little':
+                    column = array.array('i', column)
+                    column.byteswap()
+                column.tofile(f)
+
+    @staticmethod
+    def load(in_path: str) -> 'byteCode':
+        with open(in_path, 'rb') as f:
+            if f.read(len(BYTECODE_MAGIC)) != BYTECODE_MAGIC:
+                error(Error.SIMULATE, f"{bolden(in_path)} is not a mandarine bytecode file", flags = LogFlag.FAIL)
+            header = json.loads(f.read(int.from_bytes(f.read(4), 'little')).decode("utf-8"))
+            ret = byteCode(strings = header["strings"], consts = header["consts"], files = header["files"], names = header["names"], types = array.array('b', header["types"]), fused = header["fused"])
+            for column in (ret.opcode, ret.operand, ret.target, ret.loc_file, ret.loc_line, ret.loc_col):
+                column.fromfile(f, header["count"])
+                if sys.byteorder != 'little':
+                    column.byteswap()
+        return ret
+
+def Lower_bytecode(data: codeBlock) -> byteCode:
+
+    if (n:=OP.COUNT.value) != (m:=46):
+        error(Error.ENUM, f"{BOLD_}Exhaustive operation lowering protection in {BOLD_}Lower_bytecode{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
+
+    jumps: list[int] = Resolve_labels(data)
+    ret: byteCode = byteCode()
+    strings: dict[str, int] = {}
+    files: dict[str, int] = {}
+    # variables are already dense slots, so the name and type tables are just the slot list
+    ret.names = [x.name for x in data.slots]
+    ret.types = array.array('b', [x.type.value for x in data.slots])
+
+    def intern(table: dict[str, int], values: list[str], value: str) -> int:
+        if value not in table:
+            table[value] = len(values)
+            values.append(value)
+        return table[value]
+
+    condition: OP | None = None
+    codes: list[int] = Op_codes(data)
+    for ip, x in enumerate(data.tokens):
+        operand = 0
+        target = -1
+        match x.type:
+            case OP.NUM:
+                operand = int(x.value)
+                if not -(1<<31) <= operand < (1<<31):
+                    ret.consts.append(operand)
+                    operand = len(ret.consts)-1
+                    target = -2
+            case OP.STRING | OP.LABEL:
+                operand = intern(strings, ret.strings, x.value)
+            case OP.VAR:
+                operand = x.value[2]
+                target = x.value[1]
+            case OP.TYPE:
+                operand = x.value.value
+            case x_type if x_type in condition_ops:
+                condition = x_type
+            case OP.CONJUMP:
+                if condition is None:
+                    error(Error.PARSE, f"CONJUMP at `{ip}` without a preceding condition", flags = LogFlag.FAIL)
+                operand = condition.value
+                target = jumps[ip]
+            case OP.JUMP:
+                target = jumps[ip]
+            case x_type if x_type in fused_ops:
+                ret.fused.append([x.value.slot, x.value.imm, x.value.cond.value if x.value.cond is not None else 0])
+                operand = len(ret.fused)-1
+                target = jumps[ip]
+        ret.opcode.append(codes[ip])
+        ret.operand.append(operand)
+        ret.target.append(target)
+        ret.loc_file.append(intern(files, ret.files, x.file_loc[0]))
+        ret.loc_line.append(x.file_loc[1])
+        ret.loc_col.append(x.file_loc[2])
+    return ret
+
+def simulate_bytecode(data: codeBlock | byteCode, out = sys.stdout, heap: pagedHeap | None = None, stdin: typing.BinaryIO | None = None):
+
+    bc: byteCode = data if isinstance(data, byteCode) else Lower_bytecode(data)
+    opcodes = bc.opcode
+    operands = bc.operand
+    targets = bc.target
+    types = [DT(x) for x in bc.types]
+    values: list[int] = [0] * len(bc.names)
+    masks: list[int] = [0xFF if x == DT.UINT8 else 0xFFFF for x in types]
+
+    m: simState = simState(heap if heap is not None else pagedHeap(), out, stdin)
+    heap = m.heap
+    stack = m.stack
+    push = stack.append
+    pop = stack.pop
+    state: ComState = ComState.NONE
+    temp1: int = -1
+    (NUM, STRING, VAR, SET, COLON, CONJUMP, JUMP, IF, WHILE, MEMWRITE8, MEMWRITE16, MEMREAD8, MEMREAD16, BUF, DOS, LINUX,
+     COPY, PRINT, PRINT_NL, PRINT_AND_NL, PRINT_CHAR, INC_VAR, DEC_VAR, VAR_ADD, VAR_SUB, CMP_VAR_JUMP) = (x.value for x in (
+        OP.NUM, OP.STRING, OP.VAR, OP.SET, OP.COLON, OP.CONJUMP, OP.JUMP, OP.IF, OP.WHILE, OP.MEMWRITE8, OP.MEMWRITE16, OP.MEMREAD8, OP.MEMREAD16, OP.BUF, OP.DOS, OP.LINUX,
+        OP.COPY, OP.PRINT, OP.PRINT_NL, OP.PRINT_AND_NL, OP.PRINT_CHAR, OP.INC_VAR, OP.DEC_VAR, OP.VAR_ADD, OP.VAR_SUB, OP.CMP_VAR_JUMP))
+    binary: dict[int, typing.Callable[[int, int], int]] = {k.value: v for k, v in binary_fun.items()}
+    conditions: dict[int, typing.Callable[[int, int], bool]] = {k.value: v for k, v in cond_fun.items()}
+    fused_slot: list[int] = [x[0] for x in bc.fused]
+    fused_imm: list[int] = [x[1] for x in bc.fused]
+    fused_test: list[typing.Callable[[int, int], bool] | None] = [conditions.get(x[2]) for x in bc.fused]
+
+    ip = 0
+    end = len(opcodes)
+    try:
+        while ip < end:
+            op = opcodes[ip]
+            if op == VAR:
+                var = operands[ip]
+                if ComState.ARITHMETIC not in state and ComState.CONDITION not in state:
+                    temp1 = var
+                push(values[var])
+            elif op == NUM:
+                push(operands[ip] if targets[ip] != -2 else bc.consts[operands[ip]])
+            elif op == CMP_VAR_JUMP:
+                f = operands[ip]
+                state = ComState.NONE
+                if not fused_test[f](values[fused_slot[f]], fused_imm[f]):
+                    ip = targets[ip]
+                    continue
+            elif op == INC_VAR or op == DEC_VAR:
+                f = operands[ip]
+                var = fused_slot[f]
+                values[var] = (values[var] + (fused_imm[f] if op == INC_VAR else -fused_imm[f])) & masks[var]
+                temp1 = var
+                state = ComState.NONE
+            elif op == VAR_ADD or op == VAR_SUB:
+                f = operands[ip]
+                var = fused_slot[f]
+                if ComState.ARITHMETIC not in state and ComState.CONDITION not in state:
+                    temp1 = var
+                push(values[var] + fused_imm[f] if op == VAR_ADD else values[var] - fused_imm[f])
+            elif op in binary:
+                a = pop()
+                push(binary[op](pop(), a))
+            elif op == CONJUMP:
+                a = pop()
+                b = pop()
+                state = ComState.NONE
+                if not conditions[operands[ip]](b, a):
+                    ip = targets[ip]
+                    continue
+            elif op == COLON:
                 if ComState.VARDEF in state:
-                    
-                    match data.vars[temp1].type:
+                    values[temp1] = pop() & masks[temp1]
+                state = ComState.NONE
+            elif op == SET:
+                state = ComState.VARDEF | ComState.ARITHMETIC
+                pop()
+            elif op == JUMP:
+                ip = targets[ip]
+                state = ComState.NONE
+                continue
+            elif op == IF or op == WHILE:
+                state = ComState.CONDITION
+            elif op == MEMWRITE8:
+                a = pop()
+                heap[pop()] = a & 0xFF
+            elif op == MEMWRITE16:
+                a = pop()
+                b = pop()
+                heap[b:b+2] = (a & 0xFFFF).to_bytes(2)
+            elif op == MEMREAD8:
+                push(heap[pop()])
+            elif op == MEMREAD16:
+                a = pop()
+                push(int.from_bytes(heap[a:a+2]))
+            elif op == STRING:
+                string = bc.strings[operands[ip]]
+                if ComState.VARDEF in state:
+                    match types[temp1]:
                         case DT.UINT8MEM:
-                            a = stack.pop()
+                            heap[m.heap_end:m.heap_end+len(string)] = bytes(ord(c) for c in string)
+                            heap[m.heap_end+len(string)] = ord('$')
+                            values[temp1] = heap.pointer(m.heap_end)
+                            m.heap_end += len(string)+1
                         case DT.UINT16MEM:
-                            a = stack.pop() * 2
-                    data.vars[temp1].value = bytearray(bfromNum(data.vars[temp1].type, heap_end))
-                    heap[heap_end] = a-2
-                    heap_end += a
-                    #data.vars[temp1].value
+                            heap[m.heap_end:m.heap_end+len(string)*2:2] = bytes(ord(c) for c in string)
+                            heap[m.heap_end+len(string)*2] = ord('$')
+                            values[temp1] = heap.pointer(m.heap_end)
+                            m.heap_end += (len(string)+1)*2
                     state = ComState.NONE
                 else:
+                    heap[m.heap_end:m.heap_end+len(string)] = bytes(ord(c) for c in string)
+                    heap[m.heap_end+len(string)] = ord('$')
+                    push(heap.pointer(m.heap_end))
+                    m.heap_end += len(string)+1
+            elif op == BUF:
+                if ComState.VARDEF not in state:
                     error(Error.SIMULATE, "Buf used in wrong position")
-            case OP.VAR:
-                #print(stack, ip, state)
-                if ComState.ARITHMETIC in state or ComState.CONDITION in state:
-                    if data.vars[x.value].type in [DT.UINT8, DT.UINT16]:
-                        stack.append(int.from_bytes(data.vars[x.value].value))
-                    elif data.vars[x.value].type in [DT.UINT8MEM, DT.UINT16MEM]:
-                        stack.append(int.from_bytes(data.vars[x.value].value))
-                    else:
-                        error(Error.SIMULATE, "Other types than UINT8 are not implemented yet")
-                else:
-                    temp1 = x.value
-                    stack.append(int.from_bytes(data.vars[x.value].value))
-                last_type = data.vars[x.value].type
-            case OP.SET:
-                state = ComState.VARDEF | ComState.ARITHMETIC
-                stack.pop()
-            case OP.DOS:
-                a = stack.pop()
-                if a == 9:
-                    b = stack.pop()
-                    for x in range(1<<8):
-                        c = chr(heap[b+x])
-                        if c == '$':
-                            break
-                        else:
-                            out.write(c)
-                elif a == 10:
-                    b = stack.pop()
-                    c = input("> ")[:256]
-                    for x in range(min(int(heap[b]),len(c))):
-                        heap[b+2+x] = ord(c[x])
-                        #print(ord(c[x]), end=" ")
-                    heap[b+1] = len(c)
-                else:
-                    error(Error.SIMULATE, "only 9 and 10 dos calls are implemented yet")
-            case OP.LINUX:
-                a = stack.pop()
-                if a == 1:
-                    b = stack.pop()
-                    c = stack.pop()
-                    d = stack.pop()
-                    if b == 1:
-                        for x in range(d):
-                            out.write(chr(heap[c+x]))
-                    elif b == 2:
-                        for x in range(d):
-                            sys.stderr.write(chr(heap[c+x]))
-                    else:
-                        error(Error.SIMULATE, "other file descriptors than `1` and `2` are not supported yet, skipping...", exitAfter=False)
-
-            case OP.MEMWRITE:
-                a = stack.pop()
-                b = stack.pop()
-                #print(ip, a, data.vars[temp1].type)
-                match data.vars[temp1].type:
-                    case DT.UINT8MEM | DT.UINT8:
-                        heap[b] = bfromNum(DT.UINT8, a)[0]
-                    case DT.UINT16MEM | DT.UINT16:
-                        heap[b:b+2] = bfromNum(DT.UINT16, a)
-                    case _:
-                        error(Error.SIMULATE, "MEM WRITE implemented only to UINT8MEM and UINT16MEM yet!")
-            case OP.MEMREAD:
-                a = stack.pop()
-                match last_type:
-                    case DT.UINT8MEM | DT.UINT8:
-                        stack.append(int.from_bytes(heap[a:a+1]))
-                    case DT.UINT16MEM | DT.UINT16:
-                        stack.append(int.from_bytes(heap[a:a+2]))
-                    case _:
-                        error(Error.SIMULATE, "MEMREAD implemented only to UINT8MEM and UINT16MEM yet!")
-                #print(stack, [x for x in heap[0:100]])
-
-            case OP.COLON:
-                if ComState.VARDEF in state:
-                    data.vars[temp1].value = bytearray(bfromNum(data.vars[temp1].type, stack.pop()))
+                match types[temp1]:
+                    case DT.UINT8MEM:
+                        a = pop()
+                    case DT.UINT16MEM:
+                        a = pop() * 2
+                values[temp1] = heap.pointer(m.heap_end)
+                heap.buf(m.heap_end, a)
+                m.heap_end += a
                 state = ComState.NONE
-        ip += 1
-        '''print(stack)
-        
+            elif op == DOS:
+                a = pop()
+                sim_dos(m, a, tuple(pop() for _ in range(dos_arity.get(a, 0))))
+            elif op == LINUX:
+                a = pop()
+                r = sim_linux(m, a, tuple(pop() for _ in range(linux_arity.get(a, 0))))
+                if a in linux_results:
+                    push(r)
+            elif op == COPY:
+                push(stack[-1])
+            elif op == PRINT:
+                out.write(str(pop()))
+            elif op == PRINT_NL:
+                out.write('\n')
+            elif op == PRINT_AND_NL:
+                out.write(str(pop()))
+                out.write('\n')
+            elif op == PRINT_CHAR:
+                out.write(chr(pop()))
+            ip += 1
+    except HeapError as e:
+        error(Error.SIMULATE, f"{e}, in `{bolden(OP(opcodes[ip]).name)}` at {bc.file_loc(ip)}", flags = LogFlag.FAIL)
+    return m
+
+sim_engines: dict[str, typing.Callable] = {
+    "standard"  : simulate_data,
+    "threaded"  : simulate_threaded,
+    "bytecode"  : simulate_bytecode,
+    "aot"       : simulate_transpiled,
+}
+
+def Run_file(in_path: str, engine: str = "standard", out = sys.stdout, dump: tuple[int, int | None] | None = None, snapshot: str | None = None, heap_limit: int | None = None, heap_file: str | None = None, stdin: str | None = None, checkpoint: tuple[str, str | int] | None = None, restore: str | None = None, profile: opProfile | None = None, branches: branchProfile | None = None, heap_use: heapProfile | None = None, trace: str | None = None) -> simState:
+    if heap_file is not None:
+        # an existing heap file keeps its size unless a limit is asked for
+        if heap_limit is None:
+            heap_limit = max(HEAP_SIZE, os.path.getsize(heap_file) if os.path.isfile(heap_file) else 0)
+        heap = mappedHeap(heap_file, heap_limit)
+    else:
+        heap = pagedHeap(heap_limit if heap_limit is not None else HEAP_SIZE)
+    feed = open(stdin, 'rb') if stdin is not None else None
+    if any(x is not None for x in (checkpoint, restore, profile, branches, heap_use, trace)):
+        # ip, stack and variables only line up between runs on the standard engine, and only its ops map onto OP one to one
+        if in_path.endswith(".mandc"):
+            error(Error.SIMULATE, f"Checkpoints, profiles and traces need the source of {bolden(in_path)}", flags = LogFlag.FAIL)
+        if engine != "standard":
+            error(Error.SIMULATE, f"Checkpoints, profiles and traces only work with the standard engine, using it instead of `{engine}`", flags = LogFlag.WARNING, exitAfter = False)
+        m = simulate_data(Parse_file(in_path), out, heap, feed, checkpoint, restore, profile = profile, branches = branches, heap_use = heap_use, trace = trace)
+    else:
+        m = Prepare_file(in_path, engine)(out, heap, feed)
+    if dump is not None:
+        Dump_heap(m.heap, *dump)
+    if snapshot is not None:
+        Snapshot_heap(m.heap, snapshot)
+    m.close()
+    if feed is not None:
+        feed.close()
+    return m
+
+def Profile_report(profile: opProfile, out = sys.stderr) -> None:
+    ops = profile.by_op()
+    total = sum(x[1] for x in ops.values()) or 1
+    out.write(f"{'op':<14} {'count':>12} {'ms':>10} {'ns/op':>8} {'time%':>6}\n")
+    for (op, (n, ns)) in sorted(ops.items(), key = lambda x: x[1][1], reverse = True):
+        out.write(f"{op.name:<14} {n:>12} {ns/1e6:>10.3f} {ns//n:>8} {100*ns/total:>6.1f}\n")
+    out.write(f"{'total':<14} {sum(x[0] for x in ops.values()):>12} {total/1e6:>10.3f}\n")
+
+def Profile_json(profile: opProfile, out_path: str) -> None:
+    with open(out_path, 'wt', encoding='utf-8') as f:
+        json.dump({op.name: {"count": n, "ns": ns} for (op, (n, ns)) in sorted(profile.by_op().items(), key = lambda x: x[1][1], reverse = True)}, f, indent = 1)
+
+def Profile_listing(profile: opProfile, out = sys.stderr) -> None:
+    # every source file the run went through, each line with the ops run for it and their time
+    lines = profile.by_line()
+    total = sum(x[1] for x in lines.values()) or 1
+    for path in dict.fromkeys(x[0] for x in lines if x[0]):
+        out.write(f"{'count':>12} {'ms':>10} {'time%':>6} | {path}\n")
+        for (i, text) in enumerate(linecache.getlines(path)):
+            if (r:=lines.get((path, i))) is None:
+                out.write(f"{'':>12} {'':>10} {'':>6} | {text.rstrip()}\n")
+            else:
+                out.write(f"{r[0]:>12} {r[1]/1e6:>10.3f} {100*r[1]/total:>6.1f} | {text.rstrip()}\n")
+
+def Profile_stacks(profile: opProfile, out_path: str) -> None:
+    # collapsed stacks (`frame;frame;leaf value` per line) in microseconds for flamegraph tools, the frames are
+    # the whiles and ifs around a line: a while spans from its LABEL to the JUMP back to it, an if from its CONJUMP
+    # to the LABEL it jumps to (unless that is the exit of a while) and an else from the JUMP over it to its LABEL
+    tokens = profile.tokens
+    name = lambda x: f"{os.path.basename(x.file_loc[0])}:{x.file_loc[1]+1}"
+    labels: dict[str, int] = {x.value: i for (i, x) in enumerate(tokens) if x.type == OP.LABEL}
+    spans: list[tuple[int, int, str]] = []
+    for (i, x) in enumerate(tokens):
+        if x.type == OP.JUMP and labels[x.value] < i:
+            spans.append((labels[x.value], i, f"while {name(x)}"))
+        elif x.type == OP.JUMP:
+            spans.append((i+1, labels[x.value], f"else {name(x)}"))
+        elif x.type in (OP.CONJUMP, OP.CMP_VAR_JUMP):
+            t = labels[x.value.label if x.type == OP.CMP_VAR_JUMP else x.value]
+            if not (tokens[t-1].type == OP.JUMP and labels[tokens[t-1].value] < i):
+                spans.append((i+1, t, f"if {name(x)}"))
+    spans.sort()
+    root = os.path.basename(tokens[0].file_loc[0]) if tokens else "-"
+    stacks: dict[str, int] = {}
+    for (i, x) in enumerate(tokens):
+        if profile.counts[i]:
+            key = ";".join([root] + [y[2] for y in spans if y[0] <= i < y[1]] + [name(x)])
+            stacks[key] = stacks.get(key, 0) + profile.times[i]
+    with open(out_path, 'wt', encoding='utf-8') as f:
+        for (key, ns) in stacks.items():
+            if ns >= 1000:
+                f.write(f"{key} {ns//1000}\n")
+
+def Branch_report(branches: branchProfile, out = sys.stderr) -> None:
+    out.write(f"{'while':<20} {'entries':>9} {'iterations':>12} {'min':>8} {'max':>8} {'mean':>10}  at\n")
+    for x in branches.loops:
+        out.write(f"{x['head']+'/'+x['exit']:<20} {x['entries']:>9} {x['iterations']:>12} {x['min'] if x['min'] is not None else '-':>8} {x['max'] if x['max'] is not None else '-':>8} {x['mean']:>10.2f}  {x['file']}:{x['line']}\n")
+    out.write(f"{'if':<20} {'taken':>9} {'not taken':>12}  at\n")
+    for x in branches.ifs:
+        out.write(f"{x['label']:<20} {x['taken']:>9} {x['not_taken']:>12}  {x['file']}:{x['line']}\n")
+
+def Branch_json(branches: branchProfile, out_path: str) -> None:
+    with open(out_path, 'wt', encoding='utf-8') as f:
+        json.dump({"loops": branches.loops, "ifs": branches.ifs}, f, indent = 1)
+
+def Heap_report(heap_use: heapProfile, out = sys.stderr) -> None:
+    # a dos small model program gets one 64k segment for all of its data
+    out.write(f"{'owner':<16} {'kind':<7} {'start':>6} {'size':>6} {'touched':>8} {'reads':>10} {'writes':>10}  at\n")
+    for x in heap_use.allocations:
+        note = "  never used" if not x["reads"] and not x["writes"] else "  partly touched" if x["touched"] < x["size"] and x["kind"] == "buf" else ""
+        out.write(f"{x['owner'] or '-':<16} {x['kind']:<7} {x['start']:>6x} {x['size']:>6} {x['touched']:>8} {x['reads']:>10} {x['writes']:>10}  {x['file']}:{x['line']}{note}\n")
+    out.write(f"{'outside':<16} {'':<7} {'':>6} {'':>6} {'':>8} {heap_use.outside['reads']:>10} {heap_use.outside['writes']:>10}\n")
+    total = sum(x["size"] for x in heap_use.allocations)
+    out.write(f"{len(heap_use.allocations)} allocations, {total} bytes, high water mark {heap_use.high_water} of {heap_use.limit} bytes"
+              f"{'' if heap_use.high_water <= 0x10000 else ', does not fit a 64k dos segment'}\n")
+
+def Heap_json(heap_use: heapProfile, out_path: str) -> None:
+    with open(out_path, 'wt', encoding='utf-8') as f:
+        json.dump({"high_water": heap_use.high_water, "limit": heap_use.limit, "allocations": heap_use.allocations, "outside": heap_use.outside}, f, indent = 1)
+
+def Prepare_file(in_path: str, engine: str = "standard") -> typing.Callable[[typing.Any, pagedHeap, typing.BinaryIO | None], simState]:
+    # everything that doesn't depend on the input is done here once, the returned function only simulates
+    if in_path.endswith(".mandc"):
+        bc = byteCode.load(in_path)
+        return lambda out, heap, stdin: simulate_bytecode(bc, out, heap, stdin)
+    if engine == "aot":
+        # the aot engine works from its cached module and only parses when the cache is cold
+        if (module:=Transpile_file(in_path)) is not None:
+            return lambda out, heap, stdin: simulate_module(module, out, heap, stdin)
+        error(Error.SIMULATE, f"{bolden(in_path)} can't be transpiled (see {bolden("__mandcache__")}), using the threaded engine", flags = LogFlag.WARNING, exitAfter = False)
+        engine = "threaded"
+    data = Parse_file(in_path)
+    if engine == "bytecode":
+        bc = Lower_bytecode(data)
+        return lambda out, heap, stdin: simulate_bytecode(bc, out, heap, stdin)
+    return lambda out, heap, stdin: sim_engines[engine](data, out, heap, stdin)
+
+def Fork_server(in_path: str, inputs: list[str], engine: str = "standard", jobs: int = 1, heap_limit: int | None = None, report = sys.stdout) -> list[dict]:
+    # the program is prepared once and every input gets a forked child sharing it copy-on-write,
+    # each child writes the program output and its own errors into temporary files the parent collects
+    if not hasattr(os, 'fork'):
+        error(Error.CMD, "Fork server mode needs `os.fork`, which this platform doesn't have", flags = LogFlag.WARNING)
+    run = Prepare_file(in_path, engine)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    results: list[dict] = [{"input": x} for x in inputs]
+    running: dict[int, tuple[int, typing.BinaryIO, typing.BinaryIO]] = {}
+    queue = list(range(len(inputs)))[::-1]
+    while queue or running:
+        while queue and len(running) < jobs:
+            i = queue.pop()
+            (out, err) = (tempfile.TemporaryFile(), tempfile.TemporaryFile())
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    os.dup2(err.fileno(), 2)
+                    with open(out.fileno(), 'w', encoding='latin-1', closefd = False) as f, open(inputs[i], 'rb') as feed:
+                        run(f, pagedHeap(heap_limit if heap_limit is not None else HEAP_SIZE), feed).close()
+                except SystemExit as e:
+                    code = e.code if type(e.code) is int else 1
+                except BaseException as e:
+                    sys.stderr.write(f"{type(e).__name__}: {e}\n")
+                    code = 1
+                sys.stderr.flush()
+                os._exit(code)
+            running[pid] = (i, out, err)
+        (pid, status) = os.wait()
+        (i, out, err) = running.pop(pid)
+        results[i]["exit"] = os.waitstatus_to_exitcode(status)
+        for (key, f) in (("output", out), ("errors", err)):
+            f.seek(0)
+            results[i][key] = f.read().decode('latin-1')
+            f.close()
+    json.dump(results, report, indent = 1)
+    report.write("\n")
+    return results
+
+def Batch_run(in_path: str, engine: str = "standard", heap_limit: int | None = None) -> dict:
+    # one program of a batch, run inside a pool worker with its output and errors captured,
+    # input comes from a .in file next to it like in the tests, or reads as empty lines
+    out = io.StringIO()
+    err = io.StringIO()
+    ret = {"program": in_path, "exit": 0, "steps": -1}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stderr(err), (open(feed, 'rb') if (feed:=Test_input(in_path)) is not None else io.BytesIO()) as f:
+            heap = pagedHeap(heap_limit if heap_limit is not None else HEAP_SIZE)
+            if engine == "standard" and not in_path.endswith(".mandc"):
+                m = simulate_data(Parse_file(in_path), out, heap, f, count = True)
+            else:
+                m = Prepare_file(in_path, engine)(out, heap, f)
+            m.close()
+            ret["steps"] = m.steps
+    except SystemExit as e:
+        ret["exit"] = e.code if type(e.code) is int else 1
+    except Exception as e:
+        err.write(f"{type(e).__name__}: {e}\n")
+        ret["exit"] = 1
+    ret["time"] = time.perf_counter() - start
+    ret["output"] = out.getvalue()
+    ret["errors"] = err.getvalue()
+    return ret
+
+def Batch_file(in_paths: list[str], engine: str = "standard", jobs: int = 1, heap_limit: int | None = None, out = sys.stdout) -> list[dict]:
+    with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as pool:
+        results = list(pool.map(Batch_run, in_paths, [engine] * len(in_paths), [heap_limit] * len(in_paths)))
+    for x in results:
+        out.write(f"== {x['program']}\n{x['output']}")
+        if x["output"] and not x["output"].endswith("\n"):
+            out.write("\n")
+        sys.stderr.write(x["errors"])
+    # op counts are only known on the standard engine
+    out.write(f"\n{'exit':>4} {'ops':>12} {'seconds':>9}  program\n")
+    for x in results:
+        out.write(f"{x['exit']:>4} {x['steps'] if x['steps'] >= 0 else '-':>12} {x['time']:>9.3f}  {x['program']}\n")
+    failed = sum(x["exit"] != 0 for x in results)
+    out.write(f"{len(results)} programs, {failed} failed, {sum(x['time'] for x in results):.3f}s simulated on {jobs} workers\n")
+    return results
+
+def Serve_session(budget: int | None = None, heap_limit: int | None = None, quantum: int = 10000) -> typing.Callable[[asyncio.StreamReader, asyncio.StreamWriter], typing.Awaitable[None]]:
+    # every connection sends the path of a program on its first line, the rest of what it sends is the program's input
+    # and everything the program prints is sent back, the connection closes when the program ends
+    programs: dict[str, tuple[float, codeBlock]] = {}
+
+    async def session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            path = (await reader.readline()).decode('utf-8', 'replace').strip()
+            if not os.path.isfile(path):
+                writer.write(f"No program at `{path}`\n".encode('utf-8'))
+                return
+            # parsed programs are shared between sessions until their file changes
+            mtime = os.path.getmtime(path)
+            if programs.get(path, (None,))[0] != mtime:
+                programs[path] = (mtime, Parse_file(path))
+            await simulate_async(programs[path][1], reader, writer, pagedHeap(heap_limit if heap_limit is not None else HEAP_SIZE), budget, quantum)
+        except (HeapError, BudgetError) as e:
+            writer.write(f"\n{e}\n".encode('utf-8'))
+        except SystemExit:
+            # error() already reported it on the server's side
+            writer.write(b"\nSimulation failed, see the server log\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
 
-        print(ip, heap_end, x)
-        w = input()
-        if w in data.vars.keys():
-            print(data.vars[w])'''
-    print()
-    for z in range(10):
-        print(f"{z*100:>4}:", end=" ")
-        for y in range(100):
-            print(f"{chr(n) if (n:=heap[z*100+y]) != 10 and n != 0 else 'n' if n != 0 else " ":>1}", end=" ")
-        print()
-    #print(heap[:15])
+    return session
+
+def Serve(host: str = "127.0.0.1", port: int = 7777, budget: int | None = None, heap_limit: int | None = None, quantum: int = 10000) -> None:
+
+    async def main() -> None:
+        server = await asyncio.start_server(Serve_session(budget, heap_limit, quantum), host, port)
+        error(Error.SIMULATE, f"Serving on {', '.join(str(x.getsockname()[:2]) for x in server.sockets)}", flags = LogFlag.INFO, exitAfter = False)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+def Parse_engine(option: str) -> str:
+    engine = option.partition('=')[2]
+    if engine not in sim_engines:
+        error(Error.CMD, f"Unknown simulation engine `{bolden(engine)}`, expected one of `{'` | `'.join(sim_engines)}`", flags = LogFlag.WARNING)
+    return engine
+
+def Parse_range(option: str, default: tuple[int, int | None]) -> tuple[int, int | None]:
+    # --option, --option=START:END or --option=START, either side may be left out, decimal or 0x prefixed
+    if '=' not in option:
+        return default
+    (start, _, end) = option.partition('=')[2].partition(':')
+    try:
+        ret = (int(start, 0) if start else default[0], int(end, 0) if end else default[1])
+    except ValueError:
+        error(Error.CMD, f"Wrong range in `{option}`, expected `START:END`", flags = LogFlag.WARNING)
+    if ret[0] < 0 or (ret[1] is not None and ret[1] < ret[0]):
+        error(Error.CMD, f"Wrong range in `{option}`, expected `START:END` with START <= END", flags = LogFlag.WARNING)
+    return ret
+
+def Parse_size(option: str) -> int:
+    # --option=N with an optional k/m/g suffix for KiB/MiB/GiB
+    value = option.partition('=')[2].lower()
+    shift = {'k': 10, 'm': 20, 'g': 30}.get(value[-1:], 0)
+    try:
+        ret = int(value[:-1] if shift else value, 0) << shift
+    except ValueError:
+        error(Error.CMD, f"Wrong size in `{option}`, expected a number of bytes like `65536`, `64k` or `1m`", flags = LogFlag.WARNING)
+    if ret <= 0:
+        error(Error.CMD, f"Size in `{option}` has to be positive", flags = LogFlag.WARNING)
+    return ret
 
 def unpack(arr: list) -> tuple[typing.Any, list]:
     if len(arr) < 1:
@@ -1666,6 +3831,51 @@ condition_ops: tuple[OP,...] = (
     OP.LE,
 )
 
+pointer_types: tuple[DT,...] = (
+    DT.UINT8MEM,
+    DT.UINT16MEM,
+)
+
+mem_width: dict[DT, int] = {
+    DT.UINT8    : 8,
+    DT.UINT8MEM : 8,
+    DT.UINT16   : 16,
+    DT.UINT16MEM: 16,
+}
+
+specialized_mem_ops: dict[tuple[OP, int], OP] = {
+    (OP.MEMWRITE, 8)    : OP.MEMWRITE8,
+    (OP.MEMWRITE, 16)   : OP.MEMWRITE16,
+    (OP.MEMREAD, 8)     : OP.MEMREAD8,
+    (OP.MEMREAD, 16)    : OP.MEMREAD16,
+}
+
+@dataclass
+class fusedOp:
+    # the ops this one stands for, anything that doesn't know a superinstruction can expand it back into them
+    ops:    list[OpType]
+    slot:   int
+    imm:    int
+    cond:   OP | None = None
+    label:  str = ""
+
+fused_ops: tuple[OP,...] = (
+    OP.INC_VAR,
+    OP.DEC_VAR,
+    OP.VAR_ADD,
+    OP.VAR_SUB,
+    OP.CMP_VAR_JUMP,
+)
+
+def Expand_fused(tokens: list[OpType], ops: tuple[OP,...] = fused_ops) -> list[OpType]:
+    ret: list[OpType] = []
+    for x in tokens:
+        if x.type in ops:
+            ret += x.value.ops
+        else:
+            ret.append(x)
+    return ret
+
 type_map: dict[str, DT] = {
     "u16p"  : DT.UINT16MEM,
     "u8p"   : DT.UINT8MEM,
@@ -1711,11 +3921,11 @@ def Shift_codeBlock(data: codeBlock, since: int, shift: int) -> codeBlock:
     
     return data
 
-def Parse_condition_block(data: codeBlock, typeof: OP, conID: int) -> list[OpType]:
+def Parse_condition_block(data: codeBlock, typeof: OP, conID: int, file_loc: tuple[str, int, int] = ("",-1,-1)) -> list[OpType]:
 
     # FIX LABELS WHEN TESTING? (idk why the problem is here)
 
-    if (n:=OP.COUNT.value) != (m:=37):
+    if (n:=OP.COUNT.value) != (m:=46):
         error(Error.ENUM, f"{BOLD_}Exhaustive operation parsing protection in {BOLD_}Parse_condition_block{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
     if data.type != CB.CONDITION:
         error(Error.PARSE, f"Passed non-condition type codeblock to {BOLD_}Parse_condition_block{BACK_}", flags = LogFlag.FAIL)
@@ -1782,12 +3992,12 @@ def Parse_condition_block(data: codeBlock, typeof: OP, conID: int) -> list[OpTyp
     if condition is None:
         error(Error.PARSE, "No condition token found", flags = LogFlag.FAIL)
     if typeof == OP.WHILE:
-        return [OpType(OP.LABEL, (loc:=left[0].loc), ("",-1,-1), f"label{conID}")] + Shift_listOps(left + [condition] + right + [OpType(OP.CONJUMP, right[-1].loc+1, ("",-1,-1))], 0, 1)
-    return left + [condition] + right + [OpType(OP.CONJUMP, right[-1].loc+1, ("",-1,-1))]
+        return [OpType(OP.LABEL, (loc:=left[0].loc), file_loc, f"label{conID}")] + Shift_listOps(left + [condition] + right + [OpType(OP.CONJUMP, right[-1].loc+1, file_loc)], 0, 1)
+    return left + [condition] + right + [OpType(OP.CONJUMP, right[-1].loc+1, file_loc)]
 
 def Third_token_parse(data: codeBlock) -> codeBlock:
 
-    if (n:=OP.COUNT.value) != (m:=37):
+    if (n:=OP.COUNT.value) != (m:=46):
         error(Error.ENUM, f"{BOLD_}Exhaustive operation parsing protection in {BOLD_}Third_token_parse{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
     if (n:=CB.COUNT.value) != (m:=5):
         error(Error.ENUM, f"{BOLD_}Exhaustive codeBlock parsing protection in {BOLD_}Third_token_parse{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
@@ -1814,7 +4024,9 @@ def Third_token_parse(data: codeBlock) -> codeBlock:
                 # return list of tokens
                 # append to list of tokens a conditional jump and (if 'while') label
                 con_token_list: list[OpType] = []
-                con_token_list = Parse_condition_block(data.tokens[index+1], OP.IF, conID)
+                # ops made up for the if (CONJUMP, JUMP, LABEL) point back at it
+                where = data.tokens[index].file_loc
+                con_token_list = Parse_condition_block(data.tokens[index+1], OP.IF, conID, where)
                 index_offset += 1
 
                 if data.tokens[index+2].type != CB.CODE:
@@ -1832,13 +4044,13 @@ def Third_token_parse(data: codeBlock) -> codeBlock:
                 code_token_list: list[OpType] = []
                 data.tokens = Shift_listOps(data.tokens, index+1, index_offset)
                 if is_else:
-                    data.tokens[index+2].tokens.append(OpType(OP.JUMP, data.tokens[index+2].tokens[-1].loc+1, ("",-1,-1), f"label{conID+1}"))
-                data.tokens[index+2].tokens.append(OpType(OP.LABEL, data.tokens[index+2].tokens[-1].loc+1, ("",-1,-1), f"label{conID}"))
+                    data.tokens[index+2].tokens.append(OpType(OP.JUMP, data.tokens[index+2].tokens[-1].loc+1, where, f"label{conID+1}"))
+                data.tokens[index+2].tokens.append(OpType(OP.LABEL, data.tokens[index+2].tokens[-1].loc+1, where, f"label{conID}"))
                 code_token_list += data.tokens[index+2].tokens
                 index_offset += 1
                 if is_else:
                     data = Shift_codeBlock(data, index+3, index_offset)
-                    data.tokens[index+4].tokens.append(OpType(OP.LABEL, data.tokens[index+4].tokens[-1].loc+1, ("",-1,-1), f"label{conID+1}"))
+                    data.tokens[index+4].tokens.append(OpType(OP.LABEL, data.tokens[index+4].tokens[-1].loc+1, where, f"label{conID+1}"))
                     code_token_list += data.tokens[index+4].tokens
                     index_offset += 1
                 #for i, x in enumerate(code_token_list):
@@ -1863,7 +4075,8 @@ def Third_token_parse(data: codeBlock) -> codeBlock:
                 # return list of tokens
                 # append to list of tokens a conditional jump and (if 'while') label
                 con_token_list: list[OpType] = []
-                con_token_list = Parse_condition_block(data.tokens[index+1], OP.WHILE, conID)
+                where = data.tokens[index].file_loc
+                con_token_list = Parse_condition_block(data.tokens[index+1], OP.WHILE, conID, where)
                 index_offset += 2
 
                 if data.tokens[index+2].type != CB.CODE:
@@ -1873,8 +4086,8 @@ def Third_token_parse(data: codeBlock) -> codeBlock:
                     #print("con > >", x, index + index_offset + i)
                 code_token_list: list[OpType] = []
                 data.tokens = Shift_listOps(data.tokens, index+1, index_offset)
-                data.tokens[index+2].tokens.append(OpType(OP.JUMP, data.tokens[index+2].tokens[-1].loc+1, ("",-1,-1), f"label{conID}"))
-                data.tokens[index+2].tokens.append(OpType(OP.LABEL, (loc:=data.tokens[index+2].tokens[-1].loc+1), ("",-1,-1), f"label{conID+1}"))
+                data.tokens[index+2].tokens.append(OpType(OP.JUMP, data.tokens[index+2].tokens[-1].loc+1, where, f"label{conID}"))
+                data.tokens[index+2].tokens.append(OpType(OP.LABEL, (loc:=data.tokens[index+2].tokens[-1].loc+1), where, f"label{conID+1}"))
                 code_token_list += data.tokens[index+2].tokens
                 index_offset += 2
                 #for i, x in enumerate(code_token_list):
@@ -1892,13 +4105,264 @@ def Third_token_parse(data: codeBlock) -> codeBlock:
         index += 1
     return data
 
-def Secound_token_parse(data: codeBlock, index_offset: int = 0) -> codeBlock:
+def Fuse_ops(data: codeBlock) -> codeBlock:
+
+    if (n:=OP.COUNT.value) != (m:=46):
+        error(Error.ENUM, f"{BOLD_}Exhaustive operation fusion protection in {BOLD_}Fuse_ops{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
+
+    tokens = data.tokens
+
+    def plain_var(ip: int) -> bool:
+        return ip < len(tokens) and tokens[ip].type == OP.VAR and tokens[ip].value[1] == 0
+
+    def number(ip: int) -> int | None:
+        if ip < len(tokens) and tokens[ip].type == OP.NUM:
+            return int(tokens[ip].value)
+        return None
+
+    def kind(ip: int) -> OP | None:
+        return tokens[ip].type if ip < len(tokens) else None
+
+    # only variables that hold a plain number, pointers are buffers in the DOS backend and can't be changed in place
+    def scalar(ip: int) -> bool:
+        return data.slots[tokens[ip].value[2]].type in (DT.UINT8, DT.UINT16)
+
+    ret: list[OpType] = []
+    ip = 0
+    while ip < len(tokens):
+        x = tokens[ip]
+        # v = v N +; and v = v N -; at the start of a statement
+        if (plain_var(ip) and scalar(ip) and (ip == 0 or kind(ip-1) in (OP.COLON, OP.LABEL, OP.JUMP, OP.CONJUMP))
+                and kind(ip+1) == OP.SET and plain_var(ip+2) and tokens[ip+2].value[2] == x.value[2]
+                and (n:=number(ip+3)) is not None and kind(ip+4) in (OP.ADD, OP.SUB) and kind(ip+5) == OP.COLON):
+            ret.append(OpType(OP.INC_VAR if kind(ip+4) == OP.ADD else OP.DEC_VAR, x.loc, x.file_loc, fusedOp(tokens[ip:ip+6], x.value[2], n)))
+            ip += 6
+        # if(v COND N) and while(v COND N) headers
+        elif (x.type in (OP.IF, OP.WHILE) and plain_var(ip+1) and scalar(ip+1) and kind(ip+2) in condition_ops
+                and (n:=number(ip+3)) is not None and kind(ip+4) == OP.CONJUMP
+                and 0 <= n <= (0xFF if data.slots[tokens[ip+1].value[2]].type == DT.UINT8 else 0xFFFF)):
+            ret.append(OpType(OP.CMP_VAR_JUMP, x.loc, x.file_loc, fusedOp(tokens[ip:ip+5], tokens[ip+1].value[2], n, tokens[ip+2].type, tokens[ip+4].value)))
+            ip += 5
+        # v N + and v N - anywhere in an expression
+        elif plain_var(ip) and (n:=number(ip+1)) is not None and kind(ip+2) in (OP.ADD, OP.SUB):
+            ret.append(OpType(OP.VAR_ADD if kind(ip+2) == OP.ADD else OP.VAR_SUB, x.loc, x.file_loc, fusedOp(tokens[ip:ip+3], x.value[2], n)))
+            ip += 3
+        else:
+            ret.append(x)
+            ip += 1
+    data.tokens = ret
+    return data
 
-    if (n:=OP.COUNT.value) != (m:=37):
+def Analyze_stack(data: codeBlock) -> codeBlock:
+
+    if (n:=OP.COUNT.value) != (m:=46):
+        error(Error.ENUM, f"{BOLD_}Exhaustive operation analysis protection in {BOLD_}Analyze_stack{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
+
+    # abstract run over the flattened ops, the stack holds literal values where they are known (for dos/linux call numbers)
+    # and None for everything else, merging paths have to agree on its depth
+    jumps: list[int] = Resolve_labels(data)
+    tokens = data.tokens
+    entry: list[tuple[list[int | None], ComState | None] | None] = [None] * len(tokens)
+    work: list[int] = []
+    max_depth = 0
+
+    def flow(ip: int, src: int, stack: list[int | None], state: ComState | None) -> None:
+        if ip >= len(tokens):
+            return
+        if entry[ip] is None:
+            entry[ip] = (stack, state)
+            work.append(ip)
+            return
+        (old, old_state) = entry[ip]
+        if len(old) != len(stack):
+            where = f"label `{bolden(tokens[ip].value)}`" if tokens[ip].type == OP.LABEL else f"`{ip}`"
+            error(Error.PARSE, f"Unbalanced stack at {where}, reached with {len(old)} and with {len(stack)} values on the stack (from {tokens[src].type.name} at {tokens[src].file_loc})", flags = LogFlag.FAIL)
+        merged = [a if a == b else None for a, b in zip(old, stack)]
+        merged_state = old_state if old_state == state else None
+        if merged != old or merged_state != old_state:
+            entry[ip] = (merged, merged_state)
+            work.append(ip)
+
+    def pop(ip: int, stack: list[int | None], count: int = 1) -> list[int | None]:
+        if len(stack) < count:
+            error(Error.PARSE, f"Not enough values on the stack for `{bolden(tokens[ip].type.name)}` at {tokens[ip].file_loc}, needs {count} found {len(stack)}", flags = LogFlag.FAIL)
+        ret = stack[len(stack)-count:][::-1]
+        del stack[len(stack)-count:]
+        return ret
+
+    def known_state(ip: int, state: ComState | None) -> ComState:
+        if state is None:
+            error(Error.PARSE, f"`{bolden(tokens[ip].type.name)}` at {tokens[ip].file_loc} is reached both inside and outside of a definition", flags = LogFlag.FAIL)
+        return state
+
+    # Third_token_parse folds every block into the ops of its if, else or while, whatever is left has nothing to run it
+    for x in tokens:
+        match x.type:
+            case OP.ELSE:
+                error(Error.PARSE, f"`{bolden("else")}` at {x.file_loc} without an if before it", flags = LogFlag.FAIL)
+            case x_type if not isinstance(x_type, OP):
+                error(Error.PARSE, f"`{bolden(x_type.name)}` codeBlock at {x.file_loc} doesn't belong to an if, else or while", flags = LogFlag.FAIL)
+
+    if tokens:
+        flow(0, 0, [], ComState.NONE)
+    while work:
+        ip = work.pop()
+        x = tokens[ip]
+        (stack, state) = entry[ip]
+        stack = stack.copy()
+        nxt = ip+1
+        match x.type:
+            case OP.NUM:
+                stack.append(int(x.value))
+            case OP.STRING:
+                if ComState.VARDEF in known_state(ip, state):
+                    state = ComState.NONE
+                else:
+                    stack.append(None)
+            case x_type if x_type in binary_fun:
+                pop(ip, stack, 2)
+                stack.append(None)
+            case OP.IF | OP.WHILE:
+                state = ComState.CONDITION
+            case OP.CONJUMP:
+                pop(ip, stack, 2)
+                state = ComState.NONE
+                flow(jumps[ip], ip, stack, state)
+            case OP.JUMP:
+                state = ComState.NONE
+                nxt = jumps[ip]
+            case OP.INC_VAR | OP.DEC_VAR:
+                state = ComState.NONE
+            case OP.VAR_ADD | OP.VAR_SUB:
+                stack.append(None)
+            case OP.CMP_VAR_JUMP:
+                state = ComState.NONE
+                flow(jumps[ip], ip, stack, state)
+            case OP.COPY:
+                stack += pop(ip, stack) * 2
+            case OP.PRINT | OP.PRINT_AND_NL | OP.PRINT_CHAR:
+                pop(ip, stack)
+            case OP.BUF:
+                if ComState.VARDEF not in known_state(ip, state):
+                    error(Error.PARSE, f"Buf used in wrong position at {x.file_loc}", flags = LogFlag.FAIL)
+                pop(ip, stack)
+                state = ComState.NONE
+            case OP.VAR:
+                stack.append(None)
+            case OP.SET:
+                pop(ip, stack)
+                state = ComState.VARDEF | ComState.ARITHMETIC
+            case OP.DOS | OP.LINUX:
+                (a,) = pop(ip, stack)
+                arity = dos_arity if x.type == OP.DOS else linux_arity
+                if a is None:
+                    error(Error.PARSE, f"`{bolden(x.type.name)}` call number at {x.file_loc} has to be a literal", flags = LogFlag.FAIL)
+                if a not in arity:
+                    error(Error.PARSE, f"Unknown `{bolden(x.type.name)}` call `{a}` at {x.file_loc}", flags = LogFlag.FAIL)
+                pop(ip, stack, arity[a])
+                if x.type == OP.LINUX and a in linux_results:
+                    stack.append(None)
+            case OP.MEMWRITE | OP.MEMWRITE8 | OP.MEMWRITE16:
+                pop(ip, stack, 2)
+            case OP.MEMREAD | OP.MEMREAD8 | OP.MEMREAD16:
+                pop(ip, stack)
+                stack.append(None)
+            case OP.COLON:
+                if ComState.VARDEF in known_state(ip, state):
+                    pop(ip, stack)
+                state = ComState.NONE
+        max_depth = max(max_depth, len(stack))
+        flow(nxt, ip, stack, state)
+
+    data.depth = [len(x[0]) if x is not None else 0 for x in entry]
+    data.max_depth = max_depth
+    return data
+
+def Specialize_ops(data: codeBlock) -> codeBlock:
+
+    if (n:=OP.COUNT.value) != (m:=46):
+        error(Error.ENUM, f"{BOLD_}Exhaustive operation specialization protection in {BOLD_}Specialize_ops{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
+
+    # picks the access width of every MEMREAD and MEMWRITE once, so the engines never look at types at run time
+    # the width comes from the pointer the address was derived from, or else from the variable the old run time check
+    # would have used (the statement target for writes, the last variable of the statement for reads)
+    tokens = data.tokens
+    stack: list[DT | None] = []
+    state: ComState = ComState.NONE
+    target: DT | None = None
+    last: DT | None = None
+    for ip, x in enumerate(tokens):
+        match x.type:
+            case OP.LABEL:
+                # reached by a jump as well, so nothing on the stack is known here
+                stack = [None] * len(stack)
+            case OP.VAR:
+                t = data.slots[x.value[2]].type
+                if ComState.ARITHMETIC not in state and ComState.CONDITION not in state:
+                    target = t
+                last = t
+                stack.append(t)
+            case OP.VAR_ADD | OP.VAR_SUB:
+                t = data.slots[x.value.slot].type
+                if ComState.ARITHMETIC not in state and ComState.CONDITION not in state:
+                    target = t
+                last = t
+                stack.append(t)
+            case OP.INC_VAR | OP.DEC_VAR:
+                target = data.slots[x.value.slot].type
+                state = ComState.NONE
+                last = None
+            case OP.STRING:
+                if ComState.VARDEF in state:
+                    state = ComState.NONE
+                else:
+                    stack.append(DT.UINT8MEM)
+            case OP.ADD | OP.SUB:
+                a = stack.pop() if stack else None
+                b = stack.pop() if stack else None
+                if b in pointer_types and a not in pointer_types:
+                    stack.append(b)
+                elif x.type == OP.ADD and a in pointer_types and b not in pointer_types:
+                    stack.append(a)
+                else:
+                    stack.append(None)
+            case x_type if x_type in binary_fun:
+                stack[-2:] = [None]
+            case OP.COPY:
+                stack.append(stack[-1] if stack else None)
+            case OP.IF | OP.WHILE:
+                state = ComState.CONDITION
+            case OP.SET:
+                state = ComState.VARDEF | ComState.ARITHMETIC
+            case OP.COLON | OP.CONJUMP | OP.JUMP | OP.BUF | OP.CMP_VAR_JUMP:
+                state = ComState.NONE
+                last = None
+            case OP.MEMREAD | OP.MEMWRITE:
+                addr = stack[-1 if x.type == OP.MEMREAD else -2] if len(stack) >= (1 if x.type == OP.MEMREAD else 2) else None
+                if addr not in pointer_types:
+                    addr = last if x.type == OP.MEMREAD else target
+                if addr not in mem_width:
+                    error(Error.PARSE, f"Can't tell the width of `{bolden(x.type.name)}` at {x.file_loc}, using 8 bits", flags = LogFlag.WARNING, exitAfter = False)
+                x.type = specialized_mem_ops[(x.type, mem_width.get(addr, 8))]
+                if x.type in (OP.MEMREAD8, OP.MEMREAD16):
+                    stack.pop()
+                    stack.append(None)
+        # everything not modeled above only has to end up with the depth Analyze_stack found
+        n = data.depth[ip+1] if ip+1 < len(tokens) else 0
+        stack = (stack + [None] * n)[:n]
+    return data
+
+def Secound_token_parse(data: codeBlock, index_offset: int = 0, slots: list[Var] | None = None) -> codeBlock:
+
+    if (n:=OP.COUNT.value) != (m:=46):
         error(Error.ENUM, f"{BOLD_}Exhaustive operation parsing protection in {BOLD_}Secound_token_parse{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
     if (n:=CB.COUNT.value) != (m:=5):
         error(Error.ENUM, f"{BOLD_}Exhaustive codeBlock parsing protection in {BOLD_}Secound_token_parse{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
     
+    if slots is None:
+        # every variable declared in the program, nested codeBlocks included, gets a dense index into the root's slots
+        slots = data.slots = []
+
     index = 0
     while index < len(data.tokens):
         match data.tokens[index].type:
@@ -1906,9 +4370,12 @@ def Secound_token_parse(data: codeBlock, index_offset: int = 0) -> codeBlock:
                 if index+1 < len(data.tokens):
                     if data.tokens[index+1].type == OP.VAR:
                         if (n:=Var(data.tokens[index].value, (m:=(data.tokens[index+1].value[0])))) not in data.vars.values():
+                            n.slot = len(slots)
+                            slots.append(n)
                             data.vars[m] = n
                             data.tokens.pop(index)
                             index_offset -= 1
+                            data.tokens[index].value = (m, data.tokens[index].value[1], n.slot)
                         else:
                             error(Error.PARSE, "var already stated", flags = LogFlag.FAIL)
                     else:
@@ -1918,9 +4385,10 @@ def Secound_token_parse(data: codeBlock, index_offset: int = 0) -> codeBlock:
             case OP.VAR:
                 if (n:=data.tokens[index].value[0]) not in data.vars.keys():
                     error(Error.PARSE, f"Variable `{BOLD_}{n}{BACK_}` stated without assigment!", flags = LogFlag.FAIL)
+                data.tokens[index].value = (n, data.tokens[index].value[1], data.vars[n].slot)
             case CB.CODE | CB.CONDITION | CB.RESOLVE:
                 data.tokens[index].vars = data.vars.copy()
-                data.tokens[index] = Secound_token_parse(data.tokens[index], index_offset)
+                data.tokens[index] = Secound_token_parse(data.tokens[index], index_offset, slots)
         if data.tokens[index].type in OP:
             #print(data.tokens[index].loc, index_offset, data.tokens[index])
             data.tokens[index].loc += index_offset
@@ -1929,7 +4397,7 @@ def Secound_token_parse(data: codeBlock, index_offset: int = 0) -> codeBlock:
         
 def First_token_parse(data: list[Token]) -> codeBlock:
 
-    if (n:=OP.COUNT.value) != (m:=37):
+    if (n:=OP.COUNT.value) != (m:=46):
         error(Error.ENUM, f"{BOLD_}Exhaustive operation parsing protection in {BOLD_}First_token_parse{BACK_}", expected = (m,n), flags = LogFlag.FAIL | LogFlag.EXPECTED)
 
     # ret: codeBlock = codeBlock(0) this line was bugging tests, actually stupid bug
@@ -1997,6 +4465,7 @@ def First_token_parse(data: list[Token]) -> codeBlock:
                 codeBlock_stack[-1].tokens.append(OpType(OP.TYPE, index + index_offset, data[index].loc, type_map[data[index].name]))
             case TOKENS.CODEOPEN:
                 codeBlock_stack.append(codeBlock(codeblock_id_index, [], {}))
+                codeBlock_stack[-1].file_loc = data[index].loc
                 match data[index].name:
                     case "(":
                         codeBlock_stack[-1].type = CB.CONDITION
@@ -2094,14 +4563,24 @@ def Parse_file(in_path: str) -> list:
     data = []
     with open(in_path, 'rt', encoding='utf-8') as f:
         data = f.read()
-    
+
+    tokens = Tokenize_source(in_path, data)
+
+    #for x in [op for row, line in enumerate(data) for op in Parse_line(in_path, row, line)]:
+        #print(x)
+    return Specialize_ops(Analyze_stack(Fuse_ops(Third_token_parse(Secound_token_parse(First_token_parse([tok for tok in tokens]))))))
+    #Print_codeBlock_ops(ops)
+    #return Parse_jump(resolve_names([op for row, line in enumerate(data) for op in Parse_line(in_path, row, line)]))
+
+def Tokenize_source(in_path: str, data: str, line: int = 0) -> list[Token]:
+    # `line` is where `data` starts in its file, the repl hands in one entry at a time
     tokens: list[TOKENS] = []
 
     token: str = ""
     index: int = 0
     slash_before: bool = False
     string_literal: bool = False
-    loc: tuple[int, int] = (0,0)
+    loc: tuple[int, int] = (line,0)
     while index < len(data):
         match data[index]:
             case '\\':
@@ -2117,7 +4596,7 @@ def Parse_file(in_path: str) -> list:
                 if slash_before:
                     token = token + data[index]
                 elif string_literal:
-                    tokens.append(Token(TOKENS.STRING, loc, token, flags = Sticky(0)))
+                    tokens.append(Token(TOKENS.STRING, (in_path,)+loc, token, flags = Sticky(0)))
                     token = ""
                     string_literal = False
                 else:
@@ -2156,12 +4635,128 @@ def Parse_file(in_path: str) -> list:
         loc = (loc[0], loc[1]+1)
     tokens += Parse_token(in_path, loc, token)
     token = ""
+    return tokens
 
-    #for x in [op for row, line in enumerate(data) for op in Parse_line(in_path, row, line)]:
-        #print(x)
-    return Third_token_parse(Secound_token_parse(First_token_parse([tok for tok in tokens])))
-    #Print_codeBlock_ops(ops)
-    #return Parse_jump(resolve_names([op for row, line in enumerate(data) for op in Parse_line(in_path, row, line)]))
+def Parse_entry(text: str, line: int, vars: dict[str, Var], slots: list[Var]) -> codeBlock:
+    # one repl entry parsed on its own, variables of earlier entries are known through `vars` and keep their slots,
+    # new ones get added to both
+    data = First_token_parse(Tokenize_source("<repl>", text, line))
+    data.vars = vars
+    data.slots = slots
+    return Specialize_ops(Analyze_stack(Fuse_ops(Third_token_parse(Secound_token_parse(data, 0, slots)))))
+
+def Entry_complete(text: str) -> bool | None:
+    # an entry is done once every bracket outside of strings and comments is closed and it ends a statement or block,
+    # None when it ends with the block of an if, an else on the next line still belongs to it
+    depth = 0
+    quoted = False
+    # word in front of the last top level bracket, a `{` right after a `)` keeps the one of its condition
+    word = ""
+    head = ""
+    code = ""
+    for line in text.splitlines():
+        for (i, x) in enumerate(line):
+            if x == '"' and (i == 0 or line[i-1] != '\\'):
+                quoted = not quoted
+                word = ""
+            elif quoted:
+                continue
+            elif line.startswith("\\\\", i):
+                break
+            elif x in "({":
+                if depth == 0 and (x == '(' or word):
+                    head = word
+                depth += 1
+                word = ""
+            elif x in ")}":
+                depth -= 1
+                word = ""
+            elif x.isalnum() or x == '_':
+                word = word + x if i and (line[i-1].isalnum() or line[i-1] == '_') else x
+            elif not x.isspace():
+                word = ""
+            code += x
+        code += "\n"
+    body = code.rstrip()
+    if depth > 0 or quoted or not body.endswith((";", "}")):
+        return False
+    return None if body.endswith("}") and head == "if" else True
+
+def Starts_else(line: str) -> bool:
+    line = line.lstrip()
+    return line.startswith("else") and not (line[4:5].isalnum() or line[4:5] == '_')
+
+def Repl(out = sys.stdout, heap_limit: int | None = None) -> None:
+    # state lives on between entries, every entry is parsed by itself and run on the standard engine's handlers,
+    # a failing entry is reported and its new variables forgotten
+    m: simState = simState(pagedHeap(heap_limit if heap_limit is not None else HEAP_SIZE), out).bind_vars([])
+    vars: dict[str, Var] = {}
+    slots: list[Var] = []
+    line = 0
+    # the line read after an if to see whether an else follows, when none does it starts the next entry
+    ahead: str | None = None
+    last = False
+    while not last:
+        text = ""
+        try:
+            while not text.strip() or not (text.lstrip().startswith(":") or Entry_complete(text)):
+                row = ahead if ahead is not None else input("... " if text.strip() else ">>> ") + "\n"
+                ahead = None
+                if text.strip() and Entry_complete(text) is None and not Starts_else(row):
+                    ahead = row
+                    break
+                text += row
+        except (EOFError, KeyboardInterrupt):
+            out.write("\n")
+            # an if that was still waiting for an else runs before the session ends
+            if not text.strip() or Entry_complete(text) is not None:
+                break
+            last = True
+        (first, start) = (text.strip(), line)
+        line += text.count("\n")
+        if first in (":q", ":quit"):
+            break
+        elif first == ":vars":
+            for x in slots:
+                out.write(f"{x.name[1:]} : {x.type.name} = {m.values[x.slot]}\n")
+            continue
+        elif first.startswith(":heap"):
+            Dump_heap(m.heap, *Parse_range(first.replace(" ", "=", 1), (0, m.heap_end)), out = out)
+            continue
+        elif first.startswith(":"):
+            out.write(f"Unknown command `{first}`, expected `:vars`, `:heap [START:END]` or `:quit`\n")
+            continue
+        (known, count) = (dict(vars), len(slots))
+        try:
+            data = Parse_entry(text, start, vars, slots)
+        except (SystemExit, Exception) as e:
+            # error() already said what went wrong when it exited, anything else is a parser bug the session outlives
+            if not isinstance(e, SystemExit):
+                error(Error.PARSE, f"Parsing the entry failed with {type(e).__name__}: {e}", flags = LogFlag.FAIL, exitAfter = False)
+            vars.clear()
+            vars.update(known)
+            del slots[count:]
+            continue
+        m.values.extend([0] * (len(slots) - len(m.values)))
+        m.masks += [0xFF if x.type == DT.UINT8 else 0xFFFF for x in slots[len(m.masks):]]
+        m.types += [x.type for x in slots[len(m.types):]]
+        (m.stack, m.jumps, m.depth) = ([0] * data.max_depth, Resolve_labels(data), data.depth)
+        (m.state, m.condition) = (ComState.NONE, None)
+        tokens = data.tokens
+        ip = 0
+        try:
+            codes = Op_codes(data)
+            while ip < len(tokens):
+                ip = sim_table[codes[ip]](m, tokens[ip], ip)
+        except HeapError as e:
+            error(Error.SIMULATE, f"{e}, in `{bolden(tokens[ip].type.name)}` at {tokens[ip].file_loc}", flags = LogFlag.FAIL, exitAfter = False)
+        except SystemExit:
+            pass
+        except Exception as e:
+            where = f", in `{bolden(tokens[ip].type.name)}` at {tokens[ip].file_loc}" if ip < len(tokens) else ""
+            error(Error.SIMULATE, f"Running the entry failed with {type(e).__name__}: {e}{where}", flags = LogFlag.FAIL, exitAfter = False)
+        out.flush()
+    m.close()
 
 # ------------------------------------------------------
 # -------------------- TEST SECTION --------------------
@@ -2177,20 +4772,178 @@ class dataHolder:
             data = f.read()
         return data == self.data
 
+# a test can come with a `.in` file next to it, fed to the program as its input
+def Test_input(path: str) -> str | None:
+    return path[:-5]+".in" if os.path.isfile(path[:-5]+".in") else None
+
+# and a `.limit` file with the --heap-limit it needs (like `128k`) when the default heap is too small
+def Test_heap_limit(path: str) -> int | None:
+    if not os.path.isfile(path[:-5]+".limit"):
+        return None
+    with open(path[:-5]+".limit", 'rt', encoding='utf-8') as f:
+        return Parse_size("--heap-limit=" + f.read().strip())
+
+# Run_file options every way of running a test has to pass on
+def Test_options(path: str) -> dict[str, typing.Any]:
+    return {"stdin": Test_input(path), "heap_limit": Test_heap_limit(path)}
+
 def record_test():
     for x in glob.glob("./tests/*.mand"):
         with open(x[:-5]+".txt", "wt", encoding='utf-8') as f:
-            simulate_data(Parse_file(x), out = f)
+            Run_file(x, out = f, **Test_options(x))
 
-def compare_test():
+def compare_test(engine: str = "standard"):
     for x in glob.glob("./tests/*.mand"):
         dh: dataHolder = dataHolder()
-        simulate_data(Parse_file(x), out = dh)
+        Run_file(x, engine, out = dh, **Test_options(x))
         if not dh.compare_with_file(x[:-5]+".txt"):
             error(Error.TEST, f"{BOLD_}{x}{BACK_} Test Failed\n", flags = LogFlag.WARNING, exitAfter = False)
         else:
             error(Error.TEST, f"{BOLD_}{x}{BACK_} Passed\n", flags = LogFlag.GOOD, exitAfter = False)
 
+# checks that take a test through another mode and back, each gets the test, its Run_file options and the recorded
+# output and returns what went wrong or None
+roundtrip_tests: dict[str, typing.Callable[[str, dict[str, typing.Any], str], str | None]] = {}
+
+def roundtrip(name: str) -> typing.Callable:
+    def register(fun: typing.Callable[[str, dict[str, typing.Any], str], str | None]) -> typing.Callable[[str, dict[str, typing.Any], str], str | None]:
+        roundtrip_tests[name] = fun
+        return fun
+    return register
+
+@roundtrip("mandc")
+def Roundtrip_mandc(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # dumped with -b, loaded back and run from the file
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, os.path.basename(path)[:-5] + ".mandc")
+        Lower_bytecode(Parse_file(path)).dump(out_path)
+        dh: dataHolder = dataHolder()
+        Run_file(out_path, out = dh, **options)
+    return None if dh.data == expected else "output of the loaded .mandc differs"
+
+@roundtrip("heap-file")
+def Roundtrip_heap_file(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # run on a heap mapped onto a file, which has to end up holding what the paged heap of a plain run held
+    with tempfile.TemporaryDirectory() as tmp:
+        (paged, mapped) = (os.path.join(tmp, "paged"), os.path.join(tmp, "mapped"))
+        dh: dataHolder = dataHolder()
+        Run_file(path, out = dataHolder(), snapshot = paged, **options)
+        Run_file(path, out = dh, heap_file = mapped, **options)
+        if dh.data != expected:
+            return "output on the mapped heap differs"
+        with open(paged, 'rb') as a, open(mapped, 'rb') as b:
+            (a, b) = (a.read(), b.read())
+    if a != b:
+        return f"heap file differs from the paged heap, first at byte {next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))}"
+    return None
+
+# ops a test runs on the standard engine
+def Test_steps(path: str, options: dict[str, typing.Any]) -> int:
+    with (open(options["stdin"], 'rb') if options["stdin"] is not None else contextlib.nullcontext()) as f:
+        m = simulate_data(Parse_file(path), dataHolder(), pagedHeap(options["heap_limit"] or HEAP_SIZE), f, count = True)
+        m.close()
+    return m.steps
+
+@roundtrip("checkpoint")
+def Roundtrip_checkpoint(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # a checkpoint halfway through the run, restoring it has to print the rest of the recorded output
+    if (steps:=Test_steps(path, options)) < 2:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = os.path.join(tmp, "checkpoint")
+        (first, rest) = (dataHolder(), dataHolder())
+        Run_file(path, out = first, checkpoint = (saved, steps // 2), **options)
+        Run_file(path, out = rest, restore = saved, **options)
+    if first.data != expected:
+        return "output of the run taking the checkpoint differs"
+    if not expected.endswith(rest.data):
+        return f"output after restoring at op {steps // 2} doesn't end the recorded output"
+    return None
+
+@roundtrip("fork")
+def Roundtrip_fork(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # the fork server runs the test on its input twice at the same time, both children have to print the recorded output
+    if not hasattr(os, 'fork'):
+        return None
+    feed = options["stdin"] if options["stdin"] is not None else os.devnull
+    for x in Fork_server(path, [feed, feed], jobs = 2, heap_limit = options["heap_limit"], report = io.StringIO()):
+        if x["exit"] != 0:
+            return f"forked child exited with {x['exit']}, {x['errors'].strip()}"
+        if x["output"] != expected:
+            return "output of a forked child differs"
+    return None
+
+@roundtrip("server")
+def Roundtrip_server(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # two clients of the -a server at once, switching between them every few ops, both have to get the recorded output
+    feed = b""
+    if options["stdin"] is not None:
+        with open(options["stdin"], 'rb') as f:
+            feed = f.read()
+
+    async def client(host: str, port: int) -> str:
+        (reader, writer) = await asyncio.open_connection(host, port)
+        writer.write(path.encode('utf-8') + b"\n" + feed)
+        writer.write_eof()
+        ret = (await reader.read()).decode('latin-1')
+        writer.close()
+        await writer.wait_closed()
+        return ret
+
+    async def main() -> list[str]:
+        server = await asyncio.start_server(Serve_session(heap_limit = options["heap_limit"], quantum = 7), "127.0.0.1", 0)
+        async with server:
+            return await asyncio.gather(*[client(*server.sockets[0].getsockname()[:2]) for _ in range(2)])
+
+    for x in asyncio.run(main()):
+        if x != expected:
+            return f"output sent back by the server differs, got {x!r}"
+    return None
+
+@roundtrip("batch")
+def Roundtrip_batch(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # the test twice in a --batch on two worker processes, both have to print the recorded output and count their ops
+    for x in Batch_file([path, path], jobs = 2, heap_limit = options["heap_limit"], out = io.StringIO()):
+        if x["exit"] != 0:
+            return f"batch run exited with {x['exit']}, {x['errors'].strip()}"
+        if x["output"] != expected:
+            return "output of a batch run differs"
+        if x["steps"] <= 0:
+            return "batch run didn't count its ops"
+    return None
+
+@roundtrip("trace")
+def Roundtrip_trace(path: str, options: dict[str, typing.Any], expected: str) -> str | None:
+    # a --trace run printed back like -r does, one line for every op run, naming the op and source of its ip
+    tokens = Parse_file(path).tokens
+    with tempfile.TemporaryDirectory() as tmp:
+        traced = os.path.join(tmp, "trace")
+        dh: dataHolder = dataHolder()
+        Run_file(path, out = dh, trace = traced, **options)
+        printed = io.StringIO()
+        Print_trace(traced, printed)
+    if dh.data != expected:
+        return "output of the traced run differs"
+    lines = printed.getvalue().splitlines()
+    if len(lines) != (steps:=Test_steps(path, options)):
+        return f"-r printed {len(lines)} records for {steps} ops run"
+    for line in lines:
+        (ip, op) = line.split()[:2]
+        x = tokens[int(ip)]
+        if op != x.type.name or not line.endswith(f"{x.file_loc[0]}:{x.file_loc[1]+1}:{x.file_loc[2]}"):
+            return f"record `{line.strip()}` doesn't match `{x.type.name}` at {x.file_loc}"
+    return None
+
+def roundtrip_test():
+    for x in glob.glob("./tests/*.mand"):
+        with open(x[:-5]+".txt", "rt", encoding='utf-8') as f:
+            expected = f.read()
+        for (name, check) in roundtrip_tests.items():
+            if (problem:=check(x, Test_options(x), expected)) is not None:
+                error(Error.TEST, f"{BOLD_}{x}{BACK_} {name} round trip Failed, {problem}\n", flags = LogFlag.WARNING, exitAfter = False)
+            else:
+                error(Error.TEST, f"{BOLD_}{x}{BACK_} {name} round trip Passed\n", flags = LogFlag.GOOD, exitAfter = False)
+
 # CMD LINE
 
 if __name__ == "__main__":
@@ -2217,28 +4970,220 @@ if __name__ == "__main__":
             else:
                 with open(input_file[:input_file.rfind('.')] + ".asm", 'wt', encoding="utf-8") as f:
                     f.write(output_string)
+        case '-b':
+            input_file, argv = unpack(argv)
+
+            if not os.path.isfile(input_file):
+                error(Error.CMD, f"Wrong file provided, compiller couldn't find file at a `{input_file}` location", flags = LogFlag.WARNING)
+            output_file: str = input_file[:input_file.rfind('.')] + ".mandc"
+            if len(argv) > 0:
+                option, argv = unpack(argv)
+                if option != '-o':
+                    error(Error.CMD, f"Unknown bytecode option `{option}`", flags = LogFlag.WARNING)
+                output_file, argv = unpack(argv)
+            Lower_bytecode(Parse_file(input_file)).dump(output_file)
+        case '-s' if argv[:1] == ["--batch"]:
+            argv = argv[1:]
+            engine: str = "standard"
+            jobs: int = os.cpu_count() or 1
+            heap_limit: int | None = None
+            programs: list[str] = []
+            while len(argv) > 0:
+                option, argv = unpack(argv)
+                if option == "-j":
+                    option, argv = unpack(argv)
+                    if not option.isdigit() or int(option) < 1:
+                        error(Error.CMD, f"Wrong job count `{option}`, expected a positive number", flags = LogFlag.WARNING)
+                    jobs = int(option)
+                elif option.startswith("--engine="):
+                    engine = Parse_engine(option)
+                elif option.startswith("--heap-limit="):
+                    heap_limit = Parse_size(option)
+                elif option.startswith("-"):
+                    error(Error.CMD, f"Unknown batch option `{option}`", flags = LogFlag.WARNING)
+                elif not os.path.isfile(option):
+                    error(Error.CMD, f"Wrong file provided, compiller couldn't find file at a `{option}` location", flags = LogFlag.WARNING)
+                else:
+                    programs.append(option)
+            if any(x["exit"] != 0 for x in Batch_file(programs, engine, jobs, heap_limit)):
+                exit(1)
         case '-s':
             input_file, argv = unpack(argv)
 
             if not os.path.isfile(input_file):
                 error(Error.CMD, f"Wrong file provided, compiller couldn't find file at a `{input_file}` location", flags = LogFlag.WARNING)
-            parsed = Parse_file(input_file)
-            
-            simulate_data(parsed)
-        case '-t':
-            test_type: str
+            engine: str = "standard"
+            dump: tuple[int, int | None] | None = None
+            snapshot: str | None = None
+            heap_limit: int | None = None
+            heap_file: str | None = None
+            stdin: str | None = None
+            checkpoint: str | None = None
+            checkpoint_at: str | int | None = None
+            restore: str | None = None
+            profile: str | None = None
+            profile_lines: str | None = None
+            branch_stats: str | None = None
+            heap_stats: str | None = None
+            trace: str | None = None
+            while len(argv) > 0:
+                option, argv = unpack(argv)
+                if option.startswith("--engine="):
+                    engine = Parse_engine(option)
+                elif option == "--dump-heap" or option.startswith("--dump-heap="):
+                    dump = Parse_range(option, (0, None))
+                elif option.startswith("--heap-snapshot="):
+                    snapshot = option.partition('=')[2]
+                elif option.startswith("--heap-limit="):
+                    heap_limit = Parse_size(option)
+                elif option.startswith("--heap-file="):
+                    heap_file = option.partition('=')[2]
+                elif option.startswith("--stdin="):
+                    stdin = option.partition('=')[2]
+                    if not os.path.isfile(stdin):
+                        error(Error.CMD, f"Wrong file provided, couldn't find input file at a `{stdin}` location", flags = LogFlag.WARNING)
+                elif option.startswith("--checkpoint="):
+                    checkpoint = option.partition('=')[2]
+                elif option.startswith("--checkpoint-at="):
+                    checkpoint_at = option.partition('=')[2]
+                    checkpoint_at = int(checkpoint_at) if checkpoint_at.isdigit() else checkpoint_at
+                elif option.startswith("--trace="):
+                    trace = option.partition('=')[2]
+                elif option == "--heap-stats" or option.startswith("--heap-stats="):
+                    heap_stats = option.partition('=')[2]
+                elif option == "--branch-stats" or option.startswith("--branch-stats="):
+                    branch_stats = option.partition('=')[2]
+                elif option == "--profile-lines" or option.startswith("--profile-lines="):
+                    profile_lines = option.partition('=')[2]
+                elif option == "--profile" or option.startswith("--profile="):
+                    profile = option.partition('=')[2]
+                elif option.startswith("--restore="):
+                    restore = option.partition('=')[2]
+                    if not os.path.isfile(restore):
+                        error(Error.CMD, f"Wrong file provided, couldn't find checkpoint at a `{restore}` location", flags = LogFlag.WARNING)
+                else:
+                    error(Error.CMD, f"Unknown simulation option `{option}`", flags = LogFlag.WARNING)
+            if (checkpoint is None) != (checkpoint_at is None):
+                error(Error.CMD, "`--checkpoint=` and `--checkpoint-at=` have to be used together", flags = LogFlag.WARNING)
+            counts: opProfile | None = opProfile() if profile is not None or profile_lines is not None else None
+            branches: branchProfile | None = branchProfile() if branch_stats is not None else None
+            heap_use: heapProfile | None = heapProfile() if heap_stats is not None else None
+            if sum((counts is not None, branches is not None or heap_use is not None, trace is not None)) > 1:
+                error(Error.CMD, "`--profile`/`--profile-lines`, `--branch-stats`/`--heap-stats` and `--trace` can't be combined", flags = LogFlag.WARNING)
+            Run_file(input_file, engine, dump = dump, snapshot = snapshot, heap_limit = heap_limit, heap_file = heap_file, stdin = stdin,
+                checkpoint = (checkpoint, checkpoint_at) if checkpoint is not None else None, restore = restore, profile = counts, branches = branches, heap_use = heap_use, trace = trace)
+            if heap_use is not None:
+                Heap_report(heap_use)
+                if heap_stats:
+                    Heap_json(heap_use, heap_stats)
+            if branches is not None:
+                Branch_report(branches)
+                if branch_stats:
+                    Branch_json(branches, branch_stats)
+            if profile is not None:
+                Profile_report(counts)
+                if profile:
+                    Profile_json(counts, profile)
+            if profile_lines is not None:
+                Profile_listing(counts)
+                if profile_lines:
+                    Profile_stacks(counts, profile_lines)
+        case '-f':
+            input_file, argv = unpack(argv)
 
-            if len(argv) > 0:
-                test_type, argv = unpack(argv)
+            if not os.path.isfile(input_file):
+                error(Error.CMD, f"Wrong file provided, compiller couldn't find file at a `{input_file}` location", flags = LogFlag.WARNING)
+            engine: str = "standard"
+            jobs: int = os.cpu_count() or 1
+            heap_limit: int | None = None
+            report: str | None = None
+            inputs: list[str] = []
+            while len(argv) > 0:
+                option, argv = unpack(argv)
+                if option.startswith("--engine="):
+                    engine = Parse_engine(option)
+                elif option.startswith("--jobs="):
+                    if not option.partition('=')[2].isdigit() or int(option.partition('=')[2]) < 1:
+                        error(Error.CMD, f"Wrong job count in `{option}`, expected a positive number", flags = LogFlag.WARNING)
+                    jobs = int(option.partition('=')[2])
+                elif option.startswith("--heap-limit="):
+                    heap_limit = Parse_size(option)
+                elif option.startswith("--report="):
+                    report = option.partition('=')[2]
+                elif option.startswith("--"):
+                    error(Error.CMD, f"Unknown fork server option `{option}`", flags = LogFlag.WARNING)
+                elif not os.path.isfile(option):
+                    error(Error.CMD, f"Wrong file provided, couldn't find input file at a `{option}` location", flags = LogFlag.WARNING)
+                else:
+                    inputs.append(option)
+            if report is None:
+                Fork_server(input_file, inputs, engine, jobs, heap_limit)
             else:
-                test_type = "compare"
+                with open(report, 'wt', encoding='utf-8') as f:
+                    Fork_server(input_file, inputs, engine, jobs, heap_limit, f)
+        case '-a':
+            host: str = "127.0.0.1"
+            port: int = 7777
+            budget: int | None = None
+            quantum: int = 10000
+            heap_limit: int | None = None
+            while len(argv) > 0:
+                option, argv = unpack(argv)
+                if option.startswith("--host="):
+                    host = option.partition('=')[2]
+                elif option.startswith(("--port=", "--budget=", "--quantum=")):
+                    if not option.partition('=')[2].isdigit() or int(option.partition('=')[2]) < 1:
+                        error(Error.CMD, f"Wrong value in `{option}`, expected a positive number", flags = LogFlag.WARNING)
+                    match option.partition('=')[0]:
+                        case "--port":
+                            port = int(option.partition('=')[2])
+                        case "--budget":
+                            budget = int(option.partition('=')[2])
+                        case "--quantum":
+                            quantum = int(option.partition('=')[2])
+                elif option.startswith("--heap-limit="):
+                    heap_limit = Parse_size(option)
+                else:
+                    error(Error.CMD, f"Unknown server option `{option}`", flags = LogFlag.WARNING)
+            Serve(host, port, budget, heap_limit, quantum)
+        case '-r':
+            input_file, argv = unpack(argv)
+
+            if not os.path.isfile(input_file):
+                error(Error.CMD, f"Wrong file provided, couldn't find trace at a `{input_file}` location", flags = LogFlag.WARNING)
+            Print_trace(input_file)
+        case '-i':
+            heap_limit: int | None = None
+            while len(argv) > 0:
+                option, argv = unpack(argv)
+                if option.startswith("--mode="):
+                    if option.partition('=')[2] not in option_token:
+                        error(Error.CMD, f"Unknown mode in `{option}`, expected one of `{'` | `'.join(option_token)}`", flags = LogFlag.WARNING)
+                    Com_Mode = option_token[option.partition('=')[2]]
+                elif option.startswith("--heap-limit="):
+                    heap_limit = Parse_size(option)
+                else:
+                    error(Error.CMD, f"Unknown repl option `{option}`", flags = LogFlag.WARNING)
+            Repl(heap_limit = heap_limit)
+        case '-t':
+            test_type: str = "compare"
+            engine: str = "standard"
+
+            while len(argv) > 0:
+                option, argv = unpack(argv)
+                if option.startswith("--engine="):
+                    engine = Parse_engine(option)
+                else:
+                    test_type = option
 
             match test_type:
                 case "record":
                     record_test()
                 case "compare":
-                    compare_test()
+                    compare_test(engine)
+                case "roundtrip":
+                    roundtrip_test()
                 case _:
-                    error(Error.CMD, f"Wrong test type provided, expected `record` or `compare`, got `{test_type}`!", flags = LogFlag.WARNING) 
+                    error(Error.CMD, f"Wrong test type provided, expected `record`, `compare` or `roundtrip`, got `{test_type}`!", flags = LogFlag.WARNING) 
         case _:
-            error(Error.CMD, f"Wrong mode provided, expected `-c` | `-s` | `-t`, got `{option}`!", flags = LogFlag.WARNING)
+            error(Error.CMD, f"Wrong mode provided, expected `-c` | `-b` | `-s` | `-f` | `-a` | `-r` | `-i` | `-t`, got `{option}`!", flags = LogFlag.WARNING)